@@ -0,0 +1,234 @@
+# this file measures how fast the objectives, component counting and whole optimizations run on synthetic regions of
+# increasing size, so that changes can be checked for performance regressions and hardware can be sized for larger
+# regions; the results are written as JSON, and a previous results file can be passed to compare against, e.g.
+#     python Benchmark.py --sizes 25 100 400 1600 --output benchmark.json --compare baseline.json
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import tracemalloc
+import subprocess
+import numpy as np
+import scipy
+import pymoo
+from scipy.spatial import Delaunay
+from pymoo.optimize import minimize
+
+from CountyMap import CountyMap, count_components_batch
+from Crops import CropTable, CROP_TYPES
+from Objectives import water_usage, technique_cost, water_usage_batch, technique_cost_batch
+from Parallel import nsga2_algorithm, evaluate_population
+from Optimizer import Dataset, TechniqueBatchProblem
+
+BENCHMARK_VERSION = 1  # increased whenever the benchmarks change in a way that makes older results incomparable
+SIZES = [25, 100, 400, 1600]  # the numbers of counties of the synthetic regions
+BATCH_SIZE = 100  # the number of solutions evaluated at once by the batched benchmarks
+MIN_SECONDS = 0.5  # every benchmark is repeated until it has run for at least this long...
+MAX_CALLS = 1000  # ...or has been called this many times
+MINIMIZE_POPULATION_SIZE = 100
+MINIMIZE_GENERATIONS = 20
+REGRESSION_THRESHOLD = 0.2  # a benchmark that is this much slower than the baseline is reported as a regression
+
+# the acres planted and the yield per acre of each crop type (in the order of CROP_TYPES) are drawn uniformly from
+# these ranges; yields are converted to the units used by the crop classes (total bushels or lbs, or lbs per acre)
+CROP_ACRES = [(500, 60000), (1000, 120000), (200, 40000), (1000, 150000), (100, 30000)]
+CROP_YIELD_PER_ACRE = [(100, 200), (25, 55), (50, 90), (400, 900), (3000, 4500)]
+YIELD_IS_PER_ACRE = [False, False, False, True, False]
+CROP_PROBABILITY = 0.5  # the probability that a county grows each crop type
+GRADIENT_RANGE = (0.1, 3.0)  # the range of gradient angles, in degrees
+
+
+def synthetic_county_map(number_counties, rng):
+    # counties are placed on a jittered square grid and connected by a Delaunay triangulation, which gives a planar
+    # map where most counties have about six neighbours, like a real county map
+    side = int(np.ceil(np.sqrt(number_counties)))
+    cells = np.arange(0, number_counties)
+    locations = np.column_stack([cells % side, cells // side]) + rng.uniform(-0.3, 0.3, (number_counties, 2))
+    triangles = Delaunay(locations).simplices
+
+    county_map = CountyMap()
+    for county in range(0, number_counties):
+        county_map.COUNTY_LIST["County %d" % county] = county
+        county_map.COUNTY_FIPS[county] = county
+        county_map.COUNTY_TECHNIQUES[county] = 0
+        county_map.COUNTY_LOCATIONS[county] = tuple(locations[county])
+    county_map.set_edges(np.concatenate([triangles[:, 0], triangles[:, 1], triangles[:, 2]]),
+                         np.concatenate([triangles[:, 1], triangles[:, 2], triangles[:, 0]]))
+    return county_map
+
+
+def synthetic_crop_table(number_counties, rng):  # a random mix of crops in every county
+    county, crop_type = np.nonzero(rng.random((number_counties, len(CROP_TYPES))) < CROP_PROBABILITY)
+    low, high = np.array(CROP_ACRES, dtype=float)[crop_type].T
+    acres = rng.uniform(low, high)
+    low, high = np.array(CROP_YIELD_PER_ACRE, dtype=float)[crop_type].T
+    crop_yield = rng.uniform(low, high) * np.where(np.array(YIELD_IS_PER_ACRE)[crop_type], 1, acres)
+    return CropTable(county, crop_type, acres, crop_yield, number_counties)
+
+
+def synthetic_dataset(number_counties, seed=1):  # a random region with the given number of counties
+    rng = np.random.default_rng(seed)
+    county_map = synthetic_county_map(number_counties, rng)
+    crop_table = synthetic_crop_table(number_counties, rng)
+    county_gradients = rng.uniform(GRADIENT_RANGE[0], GRADIENT_RANGE[1], number_counties).tolist()
+    return Dataset.from_data(county_map, crop_table, county_gradients)
+
+
+def time_calls(function, min_seconds=MIN_SECONDS, max_calls=MAX_CALLS):
+    # calls function until min_seconds have passed or it was called max_calls times; returns the number of calls and
+    # the mean number of seconds per call; one call is made beforehand so that imports and caches are not timed
+    function()
+    calls = 0
+    start_time = time.perf_counter()
+    while True:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - start_time
+        if elapsed >= min_seconds or calls >= max_calls:
+            return calls, elapsed / calls
+
+
+def peak_memory(function):  # the peak number of bytes allocated by python and numpy during a single call of function
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def count_networkx_components(county_map):  # the total number of components of all techniques, found with networkx
+    return sum([sum(1 for _ in county_map.connected_components_by_technique(technique))
+                for technique in county_map.TECHNIQUES])
+
+
+def benchmark_functions(dataset, population_size, generations, seed):
+    # the benchmarks for one dataset, as a dictionary from name to (function, number of solutions evaluated per call)
+    rng = np.random.default_rng(seed)
+    arrays = dataset.arrays
+    number_techniques = arrays["efficiency_table"].shape[1]
+    population = rng.integers(0, number_techniques, (BATCH_SIZE, dataset.NUMBER_COUNTIES))
+    solution = population[0]
+    for county, technique in enumerate(solution):
+        dataset.county_map.assign_technique_to_county(county, int(technique))
+    num_components = np.sum(dataset.county_map.count_components_by_technique(solution))
+    batch_components = np.sum(count_components_batch(arrays["edge_sources"], arrays["edge_targets"], population,
+                                                     number_techniques), axis=1)
+    county_crops = dataset.county_crops
+
+    def run_minimize():
+        result = minimize(TechniqueBatchProblem(dataset), nsga2_algorithm(population_size),
+                          termination=('n_gen', generations), seed=seed)
+        return result.algorithm.evaluator.n_eval
+
+    return {
+        "water_usage": (lambda: water_usage(county_crops, solution, dataset.county_gradients), 1),
+        "technique_cost": (lambda: technique_cost(county_crops, solution, dataset.county_gradients, num_components), 1),
+        "connected_components_by_technique": (lambda: count_networkx_components(dataset.county_map), 1),
+        "count_components_by_technique": (lambda: dataset.county_map.count_components_by_technique(solution), 1),
+        "water_usage_batch": (lambda: water_usage_batch(arrays["county_water"], arrays["efficiency_table"],
+                                                        population), BATCH_SIZE),
+        "technique_cost_batch": (lambda: technique_cost_batch(arrays["county_acreage"], arrays["cost_table"],
+                                                              population, batch_components), BATCH_SIZE),
+        "count_components_batch": (lambda: count_components_batch(arrays["edge_sources"], arrays["edge_targets"],
+                                                                  population, number_techniques), BATCH_SIZE),
+        "evaluate_population": (lambda: evaluate_population(arrays, population), BATCH_SIZE),
+        "minimize": (run_minimize, None),  # the number of evaluations is returned by the run itself
+    }
+
+
+BENCHMARKS = ["water_usage", "technique_cost", "connected_components_by_technique", "count_components_by_technique",
+              "water_usage_batch", "technique_cost_batch", "count_components_batch", "evaluate_population", "minimize"]
+
+
+def run_benchmarks(sizes=SIZES, benchmarks=BENCHMARKS, population_size=MINIMIZE_POPULATION_SIZE,
+                   generations=MINIMIZE_GENERATIONS, min_seconds=MIN_SECONDS, seed=1, verbose=True):
+    # runs every benchmark on a synthetic region of every size and returns a list of results, one dictionary per
+    # benchmark and size
+    results = []
+    for number_counties in sizes:
+        dataset = synthetic_dataset(number_counties, seed)
+        functions = benchmark_functions(dataset, population_size, generations, seed)
+        for name in benchmarks:
+            function, evaluations_per_call = functions[name]
+            if name == "minimize":  # a whole run is only timed once
+                start_time = time.perf_counter()
+                evaluations = function()
+                calls, seconds = 1, time.perf_counter() - start_time
+            else:
+                calls, seconds = time_calls(function, min_seconds)
+                evaluations = evaluations_per_call
+            result = {"benchmark": name, "counties": number_counties, "edges": len(dataset.arrays["edge_sources"]),
+                      "crops": len(dataset.crop_table), "calls": calls, "seconds_per_call": seconds,
+                      "evaluations_per_second": evaluations / seconds, "peak_memory_bytes": peak_memory(function)}
+            results.append(result)
+            if verbose:
+                print("%-36s %6d counties %14.1f evaluations/s %12d bytes" % (
+                    name, number_counties, result["evaluations_per_second"], result["peak_memory_bytes"]))
+    return results
+
+
+def machine_description():  # what the results were measured on, so that results from different machines are not
+    # mistaken for a regression
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "platform": platform.platform(), "processor": platform.processor(),
+            "python": platform.python_version(), "numpy": np.__version__, "scipy": scipy.__version__,
+            "pymoo": pymoo.__version__}
+
+
+def compare_results(baseline, results, threshold=REGRESSION_THRESHOLD):
+    # matches results to the baseline results by benchmark and size and returns (benchmark, counties, speedup) for every
+    # match together with the list of regressions, i.e. matches whose speedup is below 1 - threshold
+    baseline_throughput = {(result["benchmark"], result["counties"]): result["evaluations_per_second"]
+                           for result in baseline}
+    comparisons = [(result["benchmark"], result["counties"],
+                    result["evaluations_per_second"] / baseline_throughput[(result["benchmark"], result["counties"])])
+                   for result in results if (result["benchmark"], result["counties"]) in baseline_throughput]
+    regressions = [comparison for comparison in comparisons if comparison[2] < 1 - threshold]
+    return comparisons, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the optimizer on synthetic regions of increasing size.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="the numbers of counties to benchmark")
+    parser.add_argument("--benchmarks", nargs="+", choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument("--population-size", type=int, default=MINIMIZE_POPULATION_SIZE)
+    parser.add_argument("--generations", type=int, default=MINIMIZE_GENERATIONS)
+    parser.add_argument("--min-seconds", type=float, default=MIN_SECONDS)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="a JSON results file to compare the results against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    arguments = parser.parse_args(argv)
+
+    results = run_benchmarks(arguments.sizes, arguments.benchmarks, arguments.population_size, arguments.generations,
+                             arguments.min_seconds, arguments.seed)
+    report = {"version": BENCHMARK_VERSION, "machine": machine_description(),
+              "settings": {"batch_size": BATCH_SIZE, "population_size": arguments.population_size,
+                           "generations": arguments.generations, "seed": arguments.seed},
+              "max_rss_kilobytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, "results": results}
+    if arguments.output is not None:
+        with open(arguments.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if arguments.compare is not None:
+        with open(arguments.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("version") != BENCHMARK_VERSION:
+            raise ValueError("Baseline was written by a different version of the benchmarks.")
+        comparisons, regressions = compare_results(baseline["results"], results, arguments.threshold)
+        for name, number_counties, speedup in comparisons:
+            print("%-36s %6d counties %8.2fx%s" % (name, number_counties, speedup,
+                                                   "  REGRESSION" if speedup < 1 - arguments.threshold else ""))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
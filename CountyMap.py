@@ -1,9 +1,34 @@
 import numpy as np
-from openpyxl import load_workbook
-from networkx import from_numpy_matrix, draw, set_node_attributes, draw_networkx_labels, connected_components, \
-    compose_all  # networkx is a library used for graph operations and plotting
-import matplotlib.pyplot as plt
-from plotly.figure_factory._county_choropleth import create_choropleth  # this function creates a choropleth plot
+from DataCache import load_sheet_rows  # reads (and caches) the rows of an xlsx file
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse.csgraph import connected_components as sparse_connected_components  # labels connected components
+# of a scipy sparse graph; this is much faster than networkx and is used for counting components during optimization
+# networkx (a library used for graph operations and plotting), matplotlib and plotly are only needed for plotting, so
+# they are imported inside the functions that use them instead of whenever this file is imported
+
+
+def count_components_batch(edge_sources, edge_targets, population_techniques, number_techniques):
+    # counts the connected components of every technique for every solution of a (pop_size x n_counties) population,
+    # given the edges of the map as two arrays of county indices; this only needs arrays, so it can be used by worker
+    # processes that do not have a CountyMap
+    population_techniques = np.asarray(population_techniques, dtype=int)
+    pop_size, number_counties = population_techniques.shape
+
+    # an edge is kept only when both of its counties use the same technique, so each component of the remaining graph
+    # contains a single technique; every solution gets its own copy of the graph by offsetting node indices
+    same_technique = population_techniques[:, edge_sources] == population_techniques[:, edge_targets]
+    solution_index, edge_index = np.nonzero(same_technique)
+    offsets = solution_index * number_counties
+    graph = coo_matrix((np.ones(len(edge_index)), (edge_sources[edge_index] + offsets,
+                                                   edge_targets[edge_index] + offsets)),
+                       shape=(pop_size * number_counties, pop_size * number_counties))
+    num_labels, labels = sparse_connected_components(graph, directed=False)
+
+    # the first node of each component tells us which solution and which technique the component belongs to
+    _, first_nodes = np.unique(labels, return_index=True)
+    component_counts = np.zeros((pop_size, number_techniques), dtype=int)
+    np.add.at(component_counts, (first_nodes // number_counties, population_techniques.ravel()[first_nodes]), 1)
+    return component_counts
 
 
 class CountyMap:
@@ -13,40 +38,71 @@ class CountyMap:
         self.COUNTY_FIPS = dict()
         self.COUNTY_LOCATIONS = dict()
         self.COUNTY_TECHNIQUES = dict()
-        self.adjacencyMatrix = None
+        self.adjacency = None  # sparse (CSR) adjacency matrix; it is always symmetric
+        self.EDGE_SOURCES = np.zeros(0, dtype=int)  # every edge is stored once, with EDGE_SOURCES < EDGE_TARGETS
+        self.EDGE_TARGETS = np.zeros(0, dtype=int)
         self.NODE_COLORS_BY_TECHNIQUE = dict()
         self.TECHNIQUES = dict()
 
     def load_counties(self, source_xlsx):  # the data in source_xlsx needs to be formatted so that the first column
         # lists out all the counties that are present in the map area
-        workbook = load_workbook(filename=source_xlsx)
-        sheet = workbook.active
-        for row in range(2, sheet.max_row):  # upon loading the workbook, we iterate from the 2nd row forwards
-            if sheet.cell(row, 1).value is None:  # stop iteration if we encounter an empty cell
+        for county, row in enumerate(load_sheet_rows(source_xlsx)):  # upon loading the workbook, we iterate from the
+            # 2nd row forwards
+            if row[0] is None:  # stop iteration if we encounter an empty cell
                 break
             # we store the "index" of each county in the dictionary COUNTY_LIST and its location coordinates in
             # COUNTY_LOCATIONS, as supplied in the sheet
-            self.COUNTY_LIST[sheet.cell(row, 1).value] = row - 2
-            self.COUNTY_FIPS[row - 2] = sheet.cell(row, 9).value
-            self.COUNTY_TECHNIQUES[row - 2] = 0
-            self.COUNTY_LOCATIONS[row - 2] = (int(sheet.cell(row, 3).value),
-                                              int(sheet.cell(row, 4).value))
-        self.adjacencyMatrix = np.zeros((len(self.COUNTY_LIST), len(self.COUNTY_LIST)))  # create the adjacency matrix
-        # of size n x n for n counties
+            self.COUNTY_LIST[row[0]] = county
+            self.COUNTY_FIPS[county] = row[8]
+            self.COUNTY_TECHNIQUES[county] = 0
+            self.COUNTY_LOCATIONS[county] = (int(row[2]),
+                                             int(row[3]))
+        self.set_edges(np.zeros(0, dtype=int), np.zeros(0, dtype=int))  # create an empty sparse adjacency matrix of
+        # size n x n for n counties
 
     def load_connections(self, source_xlsx):  # the data in source_xlsx needs to be formatted so that the third and
         # fourth columns list out pairs of counties that have an edge between them
         # in our graph
-        workbook = load_workbook(filename=source_xlsx)
-        sheet = workbook.active
-        for row in range(2, sheet.max_row):  # upon loading the workbook, we iterate from the 2nd row forwards
-            if sheet.cell(row, 6).value is None or sheet.cell(row, 7).value is None:  # stop iteration if cell is empty
+        sources, targets = [], []
+        for row in load_sheet_rows(source_xlsx):  # upon loading the workbook, we iterate from the 2nd row forwards
+            if row[5] is None or row[6] is None:  # stop iteration if cell is empty
                 break
-            firstCounty = sheet.cell(row, 6).value
-            secondCounty = sheet.cell(row, 7).value
+            firstCounty = row[5]
+            secondCounty = row[6]
             # once we have our two counties determined, we find their index from our dictionary and add a link between
-            # the two counties in the adjacency matrix
-            self.adjacencyMatrix[self.COUNTY_LIST[firstCounty]][self.COUNTY_LIST[secondCounty]] = 1
+            # the two counties to the list of edges
+            sources.append(self.COUNTY_LIST[firstCounty])
+            targets.append(self.COUNTY_LIST[secondCounty])
+
+        self.set_edges(np.concatenate([self.EDGE_SOURCES, sources]).astype(int),
+                       np.concatenate([self.EDGE_TARGETS, targets]).astype(int))
+
+    def set_edges(self, sources, targets):
+        # stores the edges between counties as a list of unique edges and as a symmetric sparse adjacency matrix, so
+        # memory grows with the number of borders instead of the square of the number of counties
+        sources, targets = np.asarray(sources, dtype=int), np.asarray(targets, dtype=int)
+        edges = np.stack([np.minimum(sources, targets), np.maximum(sources, targets)], axis=1)
+        edges = np.unique(edges[edges[:, 0] != edges[:, 1]], axis=0)  # drop self loops and duplicate edges
+        self.EDGE_SOURCES, self.EDGE_TARGETS = edges[:, 0], edges[:, 1]
+
+        number_counties = len(self.COUNTY_LIST)
+        self.adjacency = csr_matrix((np.ones(2 * len(edges)), (np.concatenate([self.EDGE_SOURCES, self.EDGE_TARGETS]),
+                                                               np.concatenate([self.EDGE_TARGETS, self.EDGE_SOURCES]))),
+                                    shape=(number_counties, number_counties))
+
+    @property
+    def adjacencyMatrix(self):  # dense adjacency matrix, only kept for compatibility as it takes n x n memory
+        return self.adjacency.toarray()
+
+    def neighbours(self, county):  # indices of the counties that share a border with the given county
+        return self.adjacency.indices[self.adjacency.indptr[county]:self.adjacency.indptr[county + 1]]
+
+    def adjacency_graph(self):  # build a networkx graph of the map on demand, which is used for plotting
+        from networkx import Graph
+        graph = Graph()
+        graph.add_nodes_from(range(0, len(self.COUNTY_LIST)))
+        graph.add_edges_from(zip(self.EDGE_SOURCES.tolist(), self.EDGE_TARGETS.tolist()))
+        return graph
 
     def load_techniques(self, techniques_dictionary):
         self.TECHNIQUES = techniques_dictionary
@@ -59,16 +115,33 @@ class CountyMap:
             raise ValueError("Technique is not present in list.")
         self.COUNTY_TECHNIQUES[county] = technique
 
-    def connected_components_by_technique(self, technique):
-        techniqueGraph = from_numpy_matrix(self.adjacencyMatrix)  # create networkx graph object
+    def connected_components_by_technique(self, technique):  # this builds a networkx graph and is only meant for
+        # plotting and inspection; use count_components_by_technique for counting components during optimization
+        from networkx import connected_components
+        techniqueGraph = self.adjacency_graph()  # create networkx graph object
         for county, technique_used in self.COUNTY_TECHNIQUES.items():
             if technique != technique_used:
                 techniqueGraph.remove_node(county)  # remove all counties that don't use the given irrigation technique
 
         return connected_components(techniqueGraph)  # return the number of connected components
 
+    def count_components_by_technique(self, county_techniques=None):
+        # counts the connected components of every technique in one pass and returns them as an array indexed by
+        # technique; county_techniques defaults to the techniques currently assigned in COUNTY_TECHNIQUES
+        if county_techniques is None:
+            county_techniques = [self.COUNTY_TECHNIQUES[county] for county in range(0, len(self.COUNTY_LIST))]
+        return self.count_components_by_technique_batch(np.asarray(county_techniques)[np.newaxis, :])[0]
+
+    def count_components_by_technique_batch(self, population_techniques):
+        # population_techniques is a (pop_size x n_counties) array of technique indices; the result is a
+        # (pop_size x n_techniques) array with the number of connected components of every technique for every solution
+        number_techniques = max(max(self.TECHNIQUES, default=0), int(np.max(population_techniques, initial=0))) + 1
+        return count_components_batch(self.EDGE_SOURCES, self.EDGE_TARGETS, population_techniques, number_techniques)
+
     def draw_graph(self):
-        graph = from_numpy_matrix(self.adjacencyMatrix)  # create networkx graph object
+        from networkx import draw, set_node_attributes, draw_networkx_labels
+        import matplotlib.pyplot as plt
+        graph = self.adjacency_graph()  # create networkx graph object
         set_node_attributes(graph, self.COUNTY_LOCATIONS, 'coord')  # set attributes for coordinates of each county on
                                                                     # the graph
         # the rest of the code plots the graph in a pyplot figure
@@ -81,7 +154,9 @@ class CountyMap:
         plt.show()
 
     def draw_graph_by_technique(self, technique):
-        techniqueGraph = from_numpy_matrix(self.adjacencyMatrix)  # create networkx graph object
+        from networkx import draw, set_node_attributes, draw_networkx_labels
+        import matplotlib.pyplot as plt
+        techniqueGraph = self.adjacency_graph()  # create networkx graph object
         includedCounties = []
         for county, technique_used in self.COUNTY_TECHNIQUES.items():  # remove counties that do not use the technique
             if technique != technique_used:
@@ -105,11 +180,13 @@ class CountyMap:
         plt.show()
 
     def draw_graph_for_all_techniques(self):
+        from networkx import draw, set_node_attributes, draw_networkx_labels
+        import matplotlib.pyplot as plt
         techniqueGraphs = []
         plt.figure(figsize=(10, 10))
         plt.margins(x=0.2)
         for technique, name in self.TECHNIQUES.items():  # we create networkx graph objects
-            techniqueGraph = from_numpy_matrix(self.adjacencyMatrix)
+            techniqueGraph = self.adjacency_graph()
             includedCounties = []
             for county, technique_used in self.COUNTY_TECHNIQUES.items():
                 if technique != technique_used:
@@ -135,6 +212,8 @@ class CountyMap:
         plt.show()
 
     def county_choropleth_by_technique(self):
+        from plotly.figure_factory._county_choropleth import create_choropleth  # this function creates a choropleth
+        # plot
         techniques = [v for k, v in self.COUNTY_TECHNIQUES.items()]
         fips = [v for k, v in self.COUNTY_FIPS.items()]
         color_scale = [v for k, v in self.NODE_COLORS_BY_TECHNIQUE.items()]
@@ -1,101 +1,179 @@
-from openpyxl import load_workbook
+import numpy as np
+from DataCache import load_sheet_rows
 
-# the following classes contain data for each crop type and also functions for calculating water usage by crop
+# the following classes contain data for each crop type and also functions for calculating water usage by crop; the
+# data itself is stored in a CropTable, and every crop object is only a view of one row of that table
 
 CURRENT_AVERAGE_EFFICIENCY = 0.6285
 
 
-class Corn:
-    def __init__(self, owning_county, acres_planted, bushel_yield):
-        self.owning_county = owning_county
-        self.acres_planted = acres_planted
-        self.bushel_yield = bushel_yield
-        self.LBS_PER_BUSHEL = 56
-        self.GALLONS_PER_LB = 73.4398 * CURRENT_AVERAGE_EFFICIENCY
+class Crop:
+    __slots__ = ("table", "index")
 
-    def water_usage(self):
-        return self.bushel_yield * self.LBS_PER_BUSHEL * self.GALLONS_PER_LB
+    def __init__(self, owning_county, acres_planted, crop_yield, table=None, index=None):
+        if table is None:  # a crop created on its own is stored in a table with a single row
+            table = CropTable([owning_county], [CROP_TYPES.index(type(self))], [acres_planted], [crop_yield])
+            index = 0
+        self.table = table
+        self.index = index
+
+    @classmethod
+    def gallons(cls, acres_planted, crop_yield):  # water usage for arrays of acres planted and yields of this crop
+        raise NotImplementedError
+
+    @property
+    def owning_county(self):
+        return int(self.table.county[self.index])
 
+    @property
+    def acres_planted(self):
+        return self.table.acres[self.index]
 
-class Sorghum:
-    def __init__(self, owning_county, acres_planted, bushel_yield):
-        self.owning_county = owning_county
-        self.acres_planted = acres_planted
-        self.bushel_yield = bushel_yield
-        self.LBS_PER_BUSHEL = 50
-        self.GALLONS_PER_LB = 143.1813 * CURRENT_AVERAGE_EFFICIENCY
+    @property
+    def crop_yield(self):
+        return self.table.crop_yield[self.index]
 
     def water_usage(self):
-        return self.bushel_yield * self.LBS_PER_BUSHEL * self.GALLONS_PER_LB
+        return self.table.gallons[self.index]
 
 
-class Wheat:
-    def __init__(self, owning_county, acres_planted, bushel_yield):
-        self.owning_county = owning_county
-        self.acres_planted = acres_planted
-        self.bushel_yield = bushel_yield
-        self.LBS_PER_BUSHEL = 60
-        self.GALLONS_PER_LB = 268.7951 * CURRENT_AVERAGE_EFFICIENCY
+class Corn(Crop):
+    __slots__ = ()
+    LBS_PER_BUSHEL = 56
+    GALLONS_PER_LB = 73.4398 * CURRENT_AVERAGE_EFFICIENCY
+    bushel_yield = Crop.crop_yield
 
-    def water_usage(self):
-        return self.bushel_yield * self.LBS_PER_BUSHEL * self.GALLONS_PER_LB
+    def __init__(self, owning_county, acres_planted, bushel_yield, table=None, index=None):
+        super().__init__(owning_county, acres_planted, bushel_yield, table, index)
 
+    @classmethod
+    def gallons(cls, acres_planted, crop_yield):
+        return crop_yield * cls.LBS_PER_BUSHEL * cls.GALLONS_PER_LB
 
-class Cotton:
-    def __init__(self, owning_county, acres_planted, lbs_per_acre_yield):
-        self.owning_county = owning_county
-        self.acres_planted = acres_planted
-        self.lbs_per_acre_yield = lbs_per_acre_yield
-        self.GALLONS_PER_LB = 653.0333 * CURRENT_AVERAGE_EFFICIENCY
 
-    def water_usage(self):
-        return self.acres_planted * self.lbs_per_acre_yield * self.GALLONS_PER_LB
+class Sorghum(Crop):
+    __slots__ = ()
+    LBS_PER_BUSHEL = 50
+    GALLONS_PER_LB = 143.1813 * CURRENT_AVERAGE_EFFICIENCY
+    bushel_yield = Crop.crop_yield
 
+    def __init__(self, owning_county, acres_planted, bushel_yield, table=None, index=None):
+        super().__init__(owning_county, acres_planted, bushel_yield, table, index)
 
-class Peanuts:
-    def __init__(self, owning_county, acres_planted, lbs_yield):
-        self.owning_county = owning_county
-        self.acres_planted = acres_planted
-        self.lbs_yield = lbs_yield
-        self.GALLONS_PER_LB = 127.8593 * CURRENT_AVERAGE_EFFICIENCY
+    @classmethod
+    def gallons(cls, acres_planted, crop_yield):
+        return crop_yield * cls.LBS_PER_BUSHEL * cls.GALLONS_PER_LB
 
-    def water_usage(self):
-        return self.lbs_yield * self.GALLONS_PER_LB
 
+class Wheat(Crop):
+    __slots__ = ()
+    LBS_PER_BUSHEL = 60
+    GALLONS_PER_LB = 268.7951 * CURRENT_AVERAGE_EFFICIENCY
+    bushel_yield = Crop.crop_yield
 
-def crop_class_loader(source_xlsx):  # loads crop classes into a list by county from a source xlsx file
-    county_crops = []
-    workbook = load_workbook(filename=source_xlsx)  # load workbook
-    sheet = workbook.active
-    for row in range(2, sheet.max_row):  # iterate from 2nd row of sheet
-        if sheet.cell(row, 1).value is None:  # stop iteration if cell is blank
+    def __init__(self, owning_county, acres_planted, bushel_yield, table=None, index=None):
+        super().__init__(owning_county, acres_planted, bushel_yield, table, index)
+
+    @classmethod
+    def gallons(cls, acres_planted, crop_yield):
+        return crop_yield * cls.LBS_PER_BUSHEL * cls.GALLONS_PER_LB
+
+
+class Cotton(Crop):
+    __slots__ = ()
+    GALLONS_PER_LB = 653.0333 * CURRENT_AVERAGE_EFFICIENCY
+    lbs_per_acre_yield = Crop.crop_yield
+
+    def __init__(self, owning_county, acres_planted, lbs_per_acre_yield, table=None, index=None):
+        super().__init__(owning_county, acres_planted, lbs_per_acre_yield, table, index)
+
+    @classmethod
+    def gallons(cls, acres_planted, crop_yield):  # cotton yield is given in lbs per acre
+        return acres_planted * crop_yield * cls.GALLONS_PER_LB
+
+
+class Peanuts(Crop):
+    __slots__ = ()
+    GALLONS_PER_LB = 127.8593 * CURRENT_AVERAGE_EFFICIENCY
+    lbs_yield = Crop.crop_yield
+
+    def __init__(self, owning_county, acres_planted, lbs_yield, table=None, index=None):
+        super().__init__(owning_county, acres_planted, lbs_yield, table, index)
+
+    @classmethod
+    def gallons(cls, acres_planted, crop_yield):  # peanut yield is given in total lbs
+        return crop_yield * cls.GALLONS_PER_LB
+
+
+CROP_TYPES = [Corn, Wheat, Sorghum, Cotton, Peanuts]  # the crop type code of each class is its index in this list
+
+
+class CropTable:
+    # stores every crop of every county as columns of numpy arrays (one row per crop planted in a county), so that the
+    # water usage of each crop is computed once and totals by county or by crop type are single array reductions
+    def __init__(self, county, crop_type, acres, crop_yield, number_counties=None):
+        self.county = np.asarray(county, dtype=np.int64)  # the index of the county the crop is planted in
+        self.crop_type = np.asarray(crop_type, dtype=np.int64)  # the crop type code, see CROP_TYPES
+        self.acres = np.asarray(acres, dtype=float)  # acres planted
+        self.crop_yield = np.asarray(crop_yield, dtype=float)  # yield, in the units used by the crop class
+        self.number_counties = int(np.max(self.county, initial=-1)) + 1 if number_counties is None else number_counties
+
+        self.gallons = np.zeros(len(self.county))  # precomputed water usage of every crop
+        for code, crop_class in enumerate(CROP_TYPES):
+            rows = self.crop_type == code
+            self.gallons[rows] = crop_class.gallons(self.acres[rows], self.crop_yield[rows])
+
+    def __len__(self):
+        return len(self.county)
+
+    def county_water(self):  # total water needed by the crops of each county, before technique efficiency
+        return np.bincount(self.county, weights=self.gallons, minlength=self.number_counties)
+
+    def county_acreage(self):  # total acres planted in each county
+        return np.bincount(self.county, weights=self.acres, minlength=self.number_counties)
+
+    def water_by_crop_type(self):  # (n_counties x n_crop_types) water needed by each crop type in each county
+        return self._by_crop_type(self.gallons)
+
+    def acreage_by_crop_type(self):  # (n_counties x n_crop_types) acres planted with each crop type in each county
+        return self._by_crop_type(self.acres)
+
+    def _by_crop_type(self, weights):
+        totals = np.bincount(self.county * len(CROP_TYPES) + self.crop_type, weights=weights,
+                             minlength=self.number_counties * len(CROP_TYPES))
+        return totals.reshape(self.number_counties, len(CROP_TYPES))
+
+    def crop(self, index):  # the crop object viewing the given row of the table
+        return CROP_TYPES[self.crop_type[index]](None, None, None, table=self, index=index)
+
+    def county_crops(self):  # the crops as a list of crop objects for each county, as returned by crop_class_loader
+        county_crops = [[] for _ in range(0, self.number_counties)]
+        for index in range(0, len(self)):
+            county_crops[self.county[index]].append(self.crop(index))
+        return county_crops
+
+
+def crop_table_loader(source_xlsx):  # loads the crops of every county into a CropTable from a source xlsx file
+    county, crop_type, acres, crop_yield = [], [], [], []
+    number_counties = 0
+    for row in load_sheet_rows(source_xlsx):  # iterate over the rows of the sheet, starting from the 2nd row
+        if row[0] is None:  # stop iteration if cell is blank
             break
 
-        current_county_crops = []
-        # the following lines of code simply check the 2nd, 4th, 6th, 8th, and 10th columns for data on the 5 crops
-        # we consider; if data is found, then a class instance is made for the crop with appropriate parameters and
-        # added to the county currently under consideration
-        if sheet.cell(row, 2).value is not None:
-            current_county_crops.append(Corn(owning_county=row - 2,
-                                             acres_planted=sheet.cell(row, 2).value,
-                                             bushel_yield=sheet.cell(row, 3).value))
-        if sheet.cell(row, 4).value is not None:
-            current_county_crops.append(Wheat(owning_county=row - 2,
-                                              acres_planted=sheet.cell(row, 4).value,
-                                              bushel_yield=sheet.cell(row, 5).value))
-        if sheet.cell(row, 6).value is not None:
-            current_county_crops.append(Sorghum(owning_county=row - 2,
-                                                acres_planted=sheet.cell(row, 6).value,
-                                                bushel_yield=sheet.cell(row, 7).value))
-        if sheet.cell(row, 8).value is not None:
-            current_county_crops.append(Cotton(owning_county=row - 2,
-                                               acres_planted=sheet.cell(row, 8).value,
-                                               lbs_per_acre_yield=sheet.cell(row, 9).value))
-        if sheet.cell(row, 10).value is not None:
-            current_county_crops.append(Peanuts(owning_county=row - 2,
-                                                acres_planted=sheet.cell(row, 10).value,
-                                                lbs_yield=sheet.cell(row, 11).value))
-
-        county_crops.append(current_county_crops)
-
-    return county_crops
\ No newline at end of file
+        # the 2nd, 4th, 6th, 8th, and 10th columns hold the acres planted of the 5 crops we consider (in the order of
+        # CROP_TYPES) and the column after each holds its yield; if data is found, a row is added to the table for the
+        # crop in the county currently under consideration
+        for code in range(0, len(CROP_TYPES)):
+            if row[2 * code + 1] is not None:
+                county.append(number_counties)
+                crop_type.append(code)
+                acres.append(row[2 * code + 1])
+                crop_yield.append(row[2 * code + 2])
+
+        number_counties += 1
+
+    return CropTable(county, crop_type, acres, crop_yield, number_counties)
+
+
+def crop_class_loader(source_xlsx):  # loads crop classes into a list by county from a source xlsx file
+    return crop_table_loader(source_xlsx).county_crops()
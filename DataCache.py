@@ -0,0 +1,129 @@
+import os
+import hashlib
+import numpy as np
+from contextlib import contextmanager
+
+# the loaders for crop, gradient and county map data all read rows of values out of the active sheet of an xlsx file;
+# parsing an xlsx file is slow, so the rows are read once with openpyxl's streaming reader and then stored in a columnar
+# .npz cache next to the source file, which later runs load in milliseconds
+
+CACHE_SUFFIX = ".npz"  # the cache for ./data/CropData.xlsx is stored in ./data/CropData.xlsx.npz
+CACHE_VERSION = 3  # increase this if the layout of the cache changes so that old caches are rebuilt
+
+_LOADED_SHEETS = dict()  # sheets that were already loaded by this process, so a file used by several loaders (such as
+# CountyMapData.xlsx) is only read once
+
+
+@contextmanager
+def atomic_write(path):
+    # opens a temporary file for writing in binary mode and moves it to path once the block finishes, so other processes
+    # (and runs that are interrupted) never see a partially written file; the temporary file is removed on errors
+    temporary_path = "%s.%d.tmp" % (path, os.getpid())
+    try:
+        with open(temporary_path, "wb") as temporary_file:
+            yield temporary_file
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+def load_sheet_rows(source_xlsx, use_cache=True):
+    # returns the rows of the active sheet that the loaders read, as a list of tuples of cell values; as with the
+    # original loaders, these are the rows from the 2nd row up to (but not including) the last row of the sheet
+    stat = os.stat(source_xlsx)
+    key = (os.path.abspath(source_xlsx), stat.st_mtime_ns, stat.st_size)
+    if key not in _LOADED_SHEETS:
+        rows = _read_cache(source_xlsx, stat) if use_cache else None
+        if rows is None:
+            rows = _read_workbook(source_xlsx)
+            if use_cache:
+                _write_cache(source_xlsx, stat, rows)
+        _LOADED_SHEETS[key] = rows
+
+    return _LOADED_SHEETS[key]
+
+
+def _read_workbook(source_xlsx):  # read every row of the active sheet once, in read only (streaming) mode
+    from openpyxl import load_workbook  # openpyxl is only imported when a sheet is not cached yet
+    from openpyxl.cell.read_only import EmptyCell
+    workbook = load_workbook(filename=source_xlsx, read_only=True, data_only=True)
+    try:
+        rows, last_row = [], 0
+        for row in workbook.active.iter_rows():
+            rows.append(tuple(cell.value for cell in row))
+            if not all(isinstance(cell, EmptyCell) for cell in row):
+                last_row = len(rows)
+    finally:
+        workbook.close()
+
+    # the read only reader goes up to the dimension stored in the file and fills rows without any cells with EmptyCell,
+    # while the original loaders stopped at max_row, the last row holding a cell (with a value or only a style), so
+    # those padding rows are dropped first
+    rows = rows[:last_row]
+    rows = rows[1:-1]  # skip the header row and, like the original loaders, the last row of the sheet
+    width = max([len(row) for row in rows], default=0)
+    return [row + (None,) * (width - len(row)) for row in rows]
+
+
+def _file_hash(source_xlsx):
+    digest = hashlib.sha256()
+    with open(source_xlsx, "rb") as source:
+        for block in iter(lambda: source.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _encode_column(values):
+    # each column is stored as an array of values together with a mask of empty cells; a column holds either integers,
+    # floats or strings, and None is returned for columns mixing several of those so that they are not cached
+    present = [value for value in values if value is not None]
+    mask = np.array([value is None for value in values], dtype=bool)
+    if all(isinstance(value, (int, np.integer)) and not isinstance(value, bool) for value in present):
+        return np.array([0 if value is None else value for value in values], dtype=np.int64), mask
+    if all(isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool)
+           for value in present):
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64), mask
+    if all(isinstance(value, str) for value in present):
+        return np.array(["" if value is None else value for value in values], dtype=str), mask
+    return None
+
+
+def _write_cache(source_xlsx, stat, rows):
+    width = len(rows[0]) if rows else 0
+    arrays = dict()
+    for column in range(0, width):
+        encoded = _encode_column([row[column] for row in rows])
+        if encoded is None:  # this sheet can't be stored as plain arrays, so it is simply read from the xlsx every time
+            return
+        arrays["values_%d" % column], arrays["empty_%d" % column] = encoded
+
+    try:
+        with atomic_write(source_xlsx + CACHE_SUFFIX) as cache:
+            np.savez(cache, version=CACHE_VERSION, mtime_ns=stat.st_mtime_ns, size=stat.st_size,
+                     sha256=_file_hash(source_xlsx), n_rows=len(rows), n_columns=width, **arrays)
+    except OSError:  # the cache is only an optimization, so a read-only data directory is not an error
+        pass
+
+
+def _read_cache(source_xlsx, stat):
+    cache_path = source_xlsx + CACHE_SUFFIX
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with np.load(cache_path) as cache:
+            if int(cache["version"]) != CACHE_VERSION:
+                return None
+            # the cache is valid if the source file has the same modification time and size as when the cache was
+            # written; otherwise we fall back to comparing the hash of its contents
+            if (int(cache["mtime_ns"]), int(cache["size"])) != (stat.st_mtime_ns, stat.st_size) and \
+                    str(cache["sha256"]) != _file_hash(source_xlsx):
+                return None
+
+            columns = []
+            for column in range(0, int(cache["n_columns"])):
+                values, empty = cache["values_%d" % column].tolist(), cache["empty_%d" % column]
+                columns.append([None if empty[i] else values[i] for i in range(0, len(values))])
+            return [tuple(row) for row in zip(*columns)] if columns else [()] * int(cache["n_rows"])
+    except (OSError, KeyError, ValueError):  # a damaged cache is ignored and rebuilt
+        return None
@@ -0,0 +1,104 @@
+import os
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from pymoo.core.problem import Problem
+
+from DataCache import atomic_write
+
+# NSGA-II keeps producing solutions that it has already evaluated in earlier generations; the classes in this file
+# remember the objective values of every solution evaluated so far (up to a maximum number) so that they are not
+# computed again
+
+
+def dataset_fingerprint(*arrays):  # hash of the input data, so that a cache saved for other data is not reused
+    digest = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        digest.update(np.ascontiguousarray(array, dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+class EvaluationCache:
+    # a least recently used (LRU) cache from solutions to their objective values; the key of a solution is a 16 byte
+    # hash of its technique indices, and once max_size solutions are stored the least recently used one is evicted
+    def __init__(self, max_size=100000, fingerprint=""):
+        self.max_size = max_size
+        self.fingerprint = fingerprint
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def key(county_techniques):
+        return hashlib.blake2b(np.asarray(county_techniques, dtype=np.uint8).tobytes(), digest_size=16).digest()
+
+    def get(self, key):  # the stored objective values for key, or None if they are not in the cache
+        objectives = self.entries.get(key)
+        if objectives is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return objectives
+
+    def put(self, key, objectives):
+        self.entries[key] = np.asarray(objectives, dtype=float)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def statistics(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self.entries),
+                "hit_rate": self.hits / lookups if lookups > 0 else 0.0}
+
+    def save(self, path):  # write the cache to an .npz file, keeping the order of least to most recently used
+        keys = np.frombuffer(b"".join(self.entries.keys()), dtype=np.uint8).reshape(len(self.entries), 16)  # raw
+        # bytes, since a bytes array would drop trailing zero bytes of the keys
+        objectives = np.array(list(self.entries.values()), dtype=float)
+        with atomic_write(path) as cache_file:
+            np.savez(cache_file, fingerprint=self.fingerprint, keys=keys, objectives=objectives)
+
+    def load(self, path):  # add the entries of a saved cache, if it exists and was saved for the same data
+        if not os.path.exists(path):
+            return
+        with np.load(path) as cache_file:
+            if str(cache_file["fingerprint"]) != self.fingerprint:
+                return
+            for key, objectives in zip(cache_file["keys"], cache_file["objectives"]):
+                self.put(key.tobytes(), objectives)
+
+
+class CachedProblem(Problem):
+    # wraps a problem (TechniqueProblem or TechniqueBatchProblem) so that every solution is first looked up in an
+    # EvaluationCache and only the solutions that are not found are passed on to be evaluated
+    def __init__(self, problem, cache):
+        super().__init__(n_var=problem.n_var, n_obj=problem.n_obj, n_constr=problem.n_constr, xl=problem.xl,
+                         xu=problem.xu, **problem.data)
+        self.problem = problem
+        self.cache = cache
+        self.exclude_from_serialization = self.exclude_from_serialization + ["cache"]  # the cache is not copied
+        # into the saved history of the algorithm
+
+    def _evaluate(self, x, out, *args, **kwargs):
+        keys = [EvaluationCache.key(county_techniques) for county_techniques in x]
+        F = np.zeros((len(x), self.n_obj))
+        missing = []
+        for i, key in enumerate(keys):
+            objectives = self.cache.get(key)
+            if objectives is None:
+                missing.append(i)
+            else:
+                F[i] = objectives
+
+        if missing:
+            F[missing] = self.problem.evaluate(np.asarray(x)[missing], return_values_of=["F"])
+            for i in missing:
+                self.cache.put(keys[i], F[i])
+
+        out["F"] = F
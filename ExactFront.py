@@ -0,0 +1,269 @@
+import time
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import reverse_cuthill_mckee
+
+from Objectives import connection_factor
+from Parallel import evaluate_population
+from RunHistory import hypervolume_2d
+
+# this file computes the true Pareto front of a small region, to be used as ground truth for the heuristic front found
+# by NSGA-II; water usage and the cost before the connection factor are sums over counties, and only the number of
+# connected blocks couples the counties, so the counties are assigned one at a time (in an order that keeps the
+# "frontier" of assigned counties with unassigned neighbours small) and we only remember, for every assignment of
+# techniques and blocks on the frontier, the non-dominated (water, cost, closed blocks) totals of the counties assigned
+# so far; every other partial assignment can never become part of the front, and neither can partial assignments whose
+# lower bound is dominated by a known solution
+
+MAX_LABELS = 2000000  # the solver stops with an error if it would need to remember more partial assignments than this
+BOUND_BRANCHING = 8  # the lower bounds of the remaining counties are a tree of bound sets, in which every point is
+BOUND_DEPTH = 3  # split into BOUND_BRANCHING finer points, down to BOUND_BRANCHING ** BOUND_DEPTH points
+MAX_BOUND_FRONT = 4096  # fronts used to build the lower bound sets are coarsened to at most this many points
+INCUMBENT_PASSES = 50  # the maximum number of passes of the Pareto local search that improves the incumbents
+
+
+def elimination_order(edge_sources, edge_targets, number_counties):  # an order of the counties with a small frontier
+    adjacency = csr_matrix((np.ones(2 * len(edge_sources)), (np.concatenate([edge_sources, edge_targets]),
+                                                             np.concatenate([edge_targets, edge_sources]))),
+                           shape=(number_counties, number_counties))
+    return reverse_cuthill_mckee(adjacency, symmetric_mode=True).astype(int)
+
+
+def _non_dominated(groups, W, C, K):
+    # the indices of the labels that are not dominated (or duplicated) by another label of the same group, minimizing
+    # water W, cost C and blocks K, sorted by group, W and C; in this order every label that dominates another comes
+    # before it, so for every value of K we find the lowest cost (as a rank) seen so far among the earlier labels of
+    # the group with at most that many blocks, using a running minimum in which every group is shifted below the
+    # groups before it so that the minimum starts again at every group
+    order = np.lexsort((K, C, W, groups))
+    groups, K = groups[order], K[order]
+    ranks = np.unique(C[order], return_inverse=True)[1].reshape(-1)
+    number_ranks = len(ranks) + 1
+    starts = np.concatenate([[True], groups[1:] != groups[:-1]])
+    offsets = (np.cumsum(starts) - 1) * (number_ranks + 1)
+    dominated = np.zeros(len(order), dtype=bool)
+    for blocks in np.unique(K):
+        running = np.minimum.accumulate(np.where(K <= blocks, ranks, number_ranks) - offsets)
+        previous = np.concatenate([[number_ranks], running[:-1] + offsets[1:]])
+        dominated |= (K == blocks) & ~starts & (previous <= ranks)
+    return order[~dominated]
+
+
+def _dominated_by_incumbent(incumbent_W, incumbent_F, W, F):  # whether some incumbent is at least as good as (W, F)
+    position = np.searchsorted(incumbent_W, W, side="right") - 1
+    return (position >= 0) & (incumbent_F[np.maximum(position, 0)] <= F)
+
+
+def _bound_dominated(incumbent_W, incumbent_F, W, C, factor, bound_tree):
+    # whether every point of the lower bound set of each label, (W + bound_W, (C + bound_C) * factor), is dominated by
+    # an incumbent; a point that is dominated at a coarse level of the bound tree is dominated at every finer level as
+    # well, so only the points that are not are split into their finer points
+    labels, points = np.arange(0, len(W)), np.zeros(len(W), dtype=int)
+    for level, (bound_W, bound_C) in enumerate(bound_tree):
+        if level > 0:
+            labels = np.repeat(labels, BOUND_BRANCHING)
+            points = (points[:, np.newaxis] * BOUND_BRANCHING + np.arange(0, BOUND_BRANCHING)).ravel()
+        undominated = ~_dominated_by_incumbent(incumbent_W, incumbent_F, W[labels] + bound_W[points],
+                                               (C[labels] + bound_C[points]) * factor[labels])
+        labels, points = labels[undominated], points[undominated]
+    dominated = np.ones(len(W), dtype=bool)
+    dominated[labels] = False
+    return dominated
+
+
+def _coarsen(W, C, number_points):
+    # a lower bound set of at most number_points points for a front sorted by increasing W (and so decreasing C): the
+    # front is split into consecutive pieces, and each piece is replaced by its ideal point
+    if len(W) <= number_points:
+        return W, C
+    pieces = np.array_split(np.arange(0, len(W)), number_points)
+    return W[[piece[0] for piece in pieces]], C[[piece[-1] for piece in pieces]]
+
+
+def _bound_tree(W, C):
+    # the levels of the bound tree of a front sorted by increasing W; the front is first coarsened (or padded by
+    # repeating its last point) to exactly BOUND_BRANCHING ** BOUND_DEPTH points, and every point of a level is the
+    # ideal point of the BOUND_BRANCHING points below it
+    W, C = _coarsen(W, C, BOUND_BRANCHING ** BOUND_DEPTH)
+    padding = BOUND_BRANCHING ** BOUND_DEPTH - len(W)
+    W, C = np.concatenate([W, np.full(padding, W[-1])]), np.concatenate([C, np.full(padding, C[-1])])
+    return [(W.reshape(BOUND_BRANCHING ** level, -1)[:, 0], C.reshape(BOUND_BRANCHING ** level, -1)[:, -1])
+            for level in range(0, BOUND_DEPTH + 1)]
+
+
+def _suffix_bounds(water_options, cost_options, order):
+    # for every step, the bound tree of the (water, cost before d(l)) totals of the counties assigned after that step;
+    # as both totals are sums over counties, the front of the last k counties is the non-dominated part of every sum
+    # of a point of the front of the last k - 1 counties and an option of the next county
+    front_W, front_C = np.zeros(1), np.zeros(1)
+    bounds = [_bound_tree(front_W, front_C)]
+    for county in order[::-1].tolist():
+        W = (front_W[:, np.newaxis] + water_options[county]).ravel()
+        C = (front_C[:, np.newaxis] + cost_options[county]).ravel()
+        front = _non_dominated(np.zeros(len(W), dtype=int), W, C, np.zeros(len(W), dtype=int))
+        front_W, front_C = _coarsen(W[front], C[front], MAX_BOUND_FRONT)
+        bounds.append(_bound_tree(front_W, front_C))
+    return bounds[::-1]  # bounds[step] is the bound tree of the counties order[step:]
+
+
+def _transition(techniques, blocks, technique, neighbour_slots, kept_slots, stays):
+    # assign technique to the next county, given the techniques and blocks of the frontier; returns the techniques and
+    # (renumbered) blocks of the next frontier and the number of blocks that were closed, i.e. that have no county on
+    # the next frontier and therefore can no longer grow
+    merged = {blocks[slot] for slot in neighbour_slots if techniques[slot] == technique}
+    block = min(merged) if merged else max(blocks, default=-1) + 1
+    blocks = [block if other in merged else other for other in blocks]
+    next_techniques = [techniques[slot] for slot in kept_slots]
+    next_blocks = [blocks[slot] for slot in kept_slots]
+    if stays:
+        next_techniques.append(technique)
+        next_blocks.append(block)
+    closed = len(set(blocks) | {block}) - len(set(next_blocks))
+
+    renumbering = dict()
+    for other in next_blocks:
+        renumbering.setdefault(other, len(renumbering))
+    return (tuple(next_techniques), tuple([renumbering[other] for other in next_blocks])), closed
+
+
+def pareto_local_search(arrays, X, max_passes=INCUMBENT_PASSES, chunk_size=100000):
+    # improves a set of solutions by repeatedly changing the technique of single counties of every solution that was
+    # added to the set in the previous pass and keeping every non-dominated result; returns the final front as (X, F)
+    X = np.asarray(X, dtype=int)
+    F = evaluate_population(arrays, X)
+    front = _non_dominated(np.zeros(len(F), dtype=int), F[:, 0], F[:, 1], np.zeros(len(F), dtype=int))
+    X, F = X[front], F[front]
+    number_counties, number_techniques = X.shape[1], arrays["efficiency_table"].shape[1]
+    counties = np.repeat(np.arange(0, number_counties), number_techniques - 1)
+    shifts = np.tile(np.arange(1, number_techniques), number_counties)
+    explored = set()
+    for _ in range(0, max_passes):
+        new = [index for index in range(0, len(X)) if X[index].tobytes() not in explored]
+        if not new:
+            break
+        explored.update([X[index].tobytes() for index in new])
+        neighbours = np.repeat(X[new], len(counties), axis=0)
+        rows = np.arange(0, len(neighbours))
+        neighbours[rows, np.tile(counties, len(new))] = (neighbours[rows, np.tile(counties, len(new))] +
+                                                         np.tile(shifts, len(new))) % number_techniques
+        neighbour_F = np.concatenate([evaluate_population(arrays, neighbours[start:start + chunk_size])
+                                      for start in range(0, len(neighbours), chunk_size)])
+        X, F = np.concatenate([X, neighbours]), np.concatenate([F, neighbour_F])
+        front = _non_dominated(np.zeros(len(F), dtype=int), F[:, 0], F[:, 1], np.zeros(len(F), dtype=int))
+        X, F = X[front], F[front]
+    return X, F
+
+
+def exact_pareto_front(arrays, incumbent_X=None, max_labels=MAX_LABELS):
+    # the true Pareto front of the problem given by the arrays of problem_arrays, as (X, F, statistics); incumbent_X
+    # are known solutions (e.g. the front found by NSGA-II), which only make the search faster
+    start_time = time.time()
+    water_options = arrays["county_water"][:, np.newaxis] / arrays["efficiency_table"]  # f_w of every county and
+    cost_options = arrays["county_acreage"][:, np.newaxis] * arrays["cost_table"]  # technique, and f_c before d(l)
+    number_counties, number_techniques = water_options.shape
+    sources, targets = np.asarray(arrays["edge_sources"]), np.asarray(arrays["edge_targets"])
+
+    order = elimination_order(sources, targets, number_counties)
+    position = np.empty(number_counties, dtype=int)
+    position[order] = np.arange(0, number_counties)
+    neighbours = [[] for _ in range(0, number_counties)]
+    for source, target in zip(sources.tolist(), targets.tolist()):
+        neighbours[source].append(target)
+        neighbours[target].append(source)
+    last_step = [max([position[county]] + [position[other] for other in neighbours[county]])
+                 for county in range(0, number_counties)]  # the step after which a county leaves the frontier
+    bounds = _suffix_bounds(water_options, cost_options, order)
+
+    # the incumbents, which always include the solutions using a single technique everywhere, are improved by local
+    # search first, since the closer they are to the front the more partial assignments can be discarded
+    known_X = np.repeat(np.arange(0, number_techniques), number_counties).reshape(number_techniques, number_counties)
+    if incumbent_X is not None and len(incumbent_X) > 0:
+        known_X = np.concatenate([known_X, np.asarray(incumbent_X, dtype=int)])
+    known_X, known_F = pareto_local_search(arrays, known_X)
+    incumbent_W, incumbent_F = known_F[:, 0], known_F[:, 1]  # sorted by increasing water and so decreasing cost
+
+    frontier = []
+    states = [((), ())]  # the techniques and blocks of the frontier for every state
+    label_states = np.zeros(1, dtype=int)  # the state of every label (a partial assignment), which are sorted by state
+    W, C, K = np.zeros(1), np.zeros(1), np.zeros(1, dtype=int)
+    parents, choices = [], []  # for every step, the previous label and the technique of every label
+    max_states, max_labels_seen = 1, 1
+    for step, county in enumerate(order.tolist()):
+        neighbour_slots = [slot for slot, other in enumerate(frontier) if other in neighbours[county]]
+        kept_slots = [slot for slot, other in enumerate(frontier) if last_step[other] > step]
+        stays = last_step[county] > step
+        frontier = [frontier[slot] for slot in kept_slots] + ([county] if stays else [])
+
+        successor_ids, successors = dict(), []
+        transitions = np.zeros((len(states), number_techniques), dtype=int)  # the successor of every state and
+        closed_blocks = np.zeros((len(states), number_techniques), dtype=int)  # technique
+        for index, (techniques, blocks) in enumerate(states):
+            for technique in range(0, number_techniques):
+                state, closed = _transition(techniques, blocks, technique, neighbour_slots, kept_slots, stays)
+                if state not in successor_ids:
+                    successor_ids[state] = len(successors)
+                    successors.append(state)
+                transitions[index, technique] = successor_ids[state]
+                closed_blocks[index, technique] = closed
+        # every open block adds at least one more block, unless it merges with another block of its technique
+        open_blocks = np.array([len(set(techniques)) if techniques else int(step + 1 < number_counties)
+                                for techniques, blocks in successors])
+
+        labels = np.repeat(np.arange(0, len(W)), number_techniques)  # every label extended by every technique
+        technique = np.tile(np.arange(0, number_techniques), len(W))
+        next_states = transitions[label_states[labels], technique]
+        next_W = W[labels] + water_options[county, technique]
+        next_C = C[labels] + cost_options[county, technique]
+        next_K = K[labels] + closed_blocks[label_states[labels], technique]
+
+        # a partial assignment is discarded when every point of its lower bound set is dominated by an incumbent, or
+        # when another partial assignment with the same frontier state is at least as good in water, cost and blocks
+        keep = _non_dominated(next_states, next_W, next_C, next_K)
+        keep = keep[~_bound_dominated(incumbent_W, incumbent_F, next_W[keep], next_C[keep],
+                                      connection_factor(next_K[keep] + open_blocks[next_states[keep]]),
+                                      bounds[step + 1])]
+        if len(keep) > max_labels:
+            raise ValueError("The region is too large for the exact solver (%d partial solutions)." % len(keep))
+        if len(keep) == 0:  # every partial solution is dominated by the incumbents, which are therefore the front
+            break
+
+        used_states, label_states = np.unique(next_states[keep], return_inverse=True)
+        states = [successors[state] for state in used_states.tolist()]
+        W, C, K = next_W[keep], next_C[keep], next_K[keep]
+        parents.append(labels[keep])
+        choices.append(technique[keep])
+        max_states, max_labels_seen = max(max_states, len(states)), max(max_labels_seen, len(keep))
+
+    X = np.zeros((0, number_counties), dtype=int)
+    if len(parents) == number_counties:  # follow the parents back from every complete solution
+        labels = np.arange(0, len(W))
+        X = np.zeros((len(labels), number_counties), dtype=int)
+        for step in range(number_counties - 1, -1, -1):
+            X[:, order[step]] = choices[step][labels]
+            labels = parents[step][labels]
+
+    X = np.concatenate([X, known_X])
+    F = evaluate_population(arrays, X)
+    front = _non_dominated(np.zeros(len(F), dtype=int), F[:, 0], F[:, 1],
+                           np.zeros(len(F), dtype=int))  # sorted by f_w, with one solution for every point of the front
+    statistics = {"counties": number_counties, "front_size": len(front), "max_states": max_states,
+                  "max_partial_solutions": max_labels_seen, "seconds": time.time() - start_time}
+    return X[front], F[front], statistics
+
+
+def front_distance(exact_F, heuristic_F):
+    # how far a heuristic front is from the exact front, with both objectives scaled so that the exact front spans
+    # [0, 1]: the generational distance (mean distance from a heuristic point to the exact front), the inverted
+    # generational distance (mean distance from an exact point to the heuristic front), the share of the exact
+    # hypervolume that the heuristic front reaches and the share of heuristic points that lie on the exact front
+    exact_F, heuristic_F = np.asarray(exact_F, dtype=float), np.asarray(heuristic_F, dtype=float)
+    ideal = np.min(exact_F, axis=0)
+    scale = np.maximum(np.max(exact_F, axis=0) - ideal, 1e-12)
+    exact, heuristic = (exact_F - ideal) / scale, (heuristic_F - ideal) / scale
+    distances = np.linalg.norm(heuristic[:, np.newaxis, :] - exact[np.newaxis, :, :], axis=2)
+    reference_point = np.array([1.1, 1.1])
+    return {"generational_distance": float(np.mean(np.min(distances, axis=1))),
+            "inverted_generational_distance": float(np.mean(np.min(distances, axis=0))),
+            "hypervolume_ratio": hypervolume_2d(heuristic, reference_point) / hypervolume_2d(exact, reference_point),
+            "on_exact_front": float(np.mean(np.min(distances, axis=1) < 1e-9)),
+            "exact_front_size": len(exact_F), "heuristic_front_size": len(heuristic_F)}
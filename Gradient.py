@@ -1,14 +1,12 @@
-from openpyxl import load_workbook
+from DataCache import load_sheet_rows
 
 
 def gradient_loader(source_xlsx):  # this function simply loads county gradients from a source xlsx file
     county_gradients = []
-    workbook = load_workbook(filename=source_xlsx)  # load workbook
-    sheet = workbook.active
-    for row in range(2, sheet.max_row):  # iterate from 2nd row of sheet
-        if sheet.cell(row, 1).value is None:  # stop iteration if cell is blank
+    for row in load_sheet_rows(source_xlsx):  # iterate over the rows of the sheet, starting from the 2nd row
+        if row[0] is None:  # stop iteration if cell is blank
             break
 
-        county_gradients.append(sheet.cell(row, 2).value)  # insert value into gradient list
+        county_gradients.append(row[1])  # insert value into gradient list
 
     return county_gradients
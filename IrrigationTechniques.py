@@ -2,49 +2,125 @@ import numpy as np
 
 
 # the following classes contain data for each irrigation technique and also functions for calculating the efficiency
-# factor of each technique
-class CenterPivotIrrigation:
+# factor of each technique; the efficiency curves take a whole array of gradient angles at once, so the efficiency and
+# cost of every technique in every county can be computed in one pass and reused for a whole run
+
+TECHNIQUE_REGISTRY = []  # the technique classes, in the order of their technique index (0 -> T_1, 1 -> T_2, ...)
+TABLE_CACHE_SIZE = 8  # the number of gradient vectors whose technique tables are kept by technique_tables
+_TABLE_CACHE = dict()
+
+
+def register_technique(technique_class):  # class decorator that adds a technique to the registry, as the next index
+    TECHNIQUE_REGISTRY.append(technique_class)
+    _TABLE_CACHE.clear()
+    return technique_class
+
+
+class IrrigationTechnique:
+    NAME = None  # the name used for plots
+    NODE_COLOR = None  # the color of counties using this technique in plots
+    IMPLEMENTATION_COST_PER_ACRE = None
+
     def __init__(self, owning_county, gradient_angle):
         self.owning_county = owning_county
         self.gradient_angle = gradient_angle
-        self.IMPLEMENTATION_COST_PER_ACRE = 17
+
+    @classmethod
+    def efficiency_curve(cls, gradient_angles):  # the efficiency factor for an array of gradient angles, in degrees
+        raise NotImplementedError
+
+    @classmethod
+    def cost_curve(cls, gradient_angles):  # the implementation cost per acre for an array of gradient angles
+        return np.full(np.shape(gradient_angles), cls.IMPLEMENTATION_COST_PER_ACRE, dtype=float)
 
     def efficiency_factor(self):
+        return float(self.efficiency_curve(np.asarray(self.gradient_angle, dtype=float)))
+
+
+@register_technique
+class CenterPivotIrrigation(IrrigationTechnique):
+    NAME = "Center Pivot Irrigation"
+    NODE_COLOR = "red"
+    IMPLEMENTATION_COST_PER_ACRE = 17
+
+    @classmethod
+    def efficiency_curve(cls, gradient_angles):
         a = 0.6479
         b = 4
-        return a * np.cos(np.deg2rad(b * self.gradient_angle))
+        return a * np.cos(np.deg2rad(b * gradient_angles))
 
 
-class SprinklerIrrigation:
-    def __init__(self, owning_county, gradient_angle):
-        self.owning_county = owning_county
-        self.gradient_angle = gradient_angle
-        self.IMPLEMENTATION_COST_PER_ACRE = 23.31
+@register_technique
+class SprinklerIrrigation(IrrigationTechnique):
+    NAME = "Sprinkler Irrigation"
+    NODE_COLOR = "green"
+    IMPLEMENTATION_COST_PER_ACRE = 23.31
 
-    def efficiency_factor(self):
+    @classmethod
+    def efficiency_curve(cls, gradient_angles):
         a = 0.75
-        return a * np.cos(np.deg2rad(self.gradient_angle))
+        return a * np.cos(np.deg2rad(gradient_angles))
 
 
-class DripIrrigation:
-    def __init__(self, owning_county, gradient_angle):
-        self.owning_county = owning_county
-        self.gradient_angle = gradient_angle
-        self.IMPLEMENTATION_COST_PER_ACRE = 38.44519536
+@register_technique
+class DripIrrigation(IrrigationTechnique):
+    NAME = "Drip Irrigation"
+    NODE_COLOR = "purple"
+    IMPLEMENTATION_COST_PER_ACRE = 38.44519536
 
-    def efficiency_factor(self):
+    @classmethod
+    def efficiency_curve(cls, gradient_angles):
         a = 0.9
-        return a
+        return np.full(np.shape(gradient_angles), a)
 
 
-class FurrowIrrigation:
-    def __init__(self, owning_county, gradient_angle):
-        self.owning_county = owning_county
-        self.gradient_angle = gradient_angle
-        self.IMPLEMENTATION_COST_PER_ACRE = 8
+@register_technique
+class FurrowIrrigation(IrrigationTechnique):
+    NAME = "Furrow Irrigation"
+    NODE_COLOR = "blue"
+    IMPLEMENTATION_COST_PER_ACRE = 8
 
-    def efficiency_factor(self):
+    @classmethod
+    def efficiency_curve(cls, gradient_angles):
         a = 2.92541
         b = 2.26544
         c = -0.557759
-        return ((a * ((self.gradient_angle - c) ** 3)) / (np.exp(b * (self.gradient_angle - c)) - 1)) + 0.25
\ No newline at end of file
+        return ((a * ((gradient_angles - c) ** 3)) / (np.exp(b * (gradient_angles - c)) - 1)) + 0.25
+
+
+def technique_names():  # technique index -> name, for every registered technique
+    return {index: technique_class.NAME for index, technique_class in enumerate(TECHNIQUE_REGISTRY)}
+
+
+def technique_colors():  # technique index -> plot color, for every registered technique
+    return {index: technique_class.NODE_COLOR for index, technique_class in enumerate(TECHNIQUE_REGISTRY)}
+
+
+def efficiency_table(gradient_angles):  # efficiency factor of every technique in every county, as an
+    # (n_counties x n_techniques) array
+    gradient_angles = np.asarray(gradient_angles, dtype=float)
+    return np.column_stack([technique_class.efficiency_curve(gradient_angles)
+                            for technique_class in TECHNIQUE_REGISTRY]).reshape(len(gradient_angles), -1)
+
+
+def cost_table(gradient_angles):  # implementation cost per acre of every technique in every county, as an
+    # (n_counties x n_techniques) array
+    gradient_angles = np.asarray(gradient_angles, dtype=float)
+    return np.column_stack([technique_class.cost_curve(gradient_angles)
+                            for technique_class in TECHNIQUE_REGISTRY]).reshape(len(gradient_angles), -1)
+
+
+def technique_tables(gradient_angles):
+    # the efficiency and cost tables for a vector of gradient angles; gradients never change during a run, so the
+    # tables are computed once and then returned from a cache (read only, as they are shared between callers)
+    gradient_angles = np.asarray(gradient_angles, dtype=float)
+    key = gradient_angles.tobytes()
+    tables = _TABLE_CACHE.get(key)
+    if tables is None:
+        tables = (efficiency_table(gradient_angles), cost_table(gradient_angles))
+        for table in tables:
+            table.setflags(write=False)
+        if len(_TABLE_CACHE) >= TABLE_CACHE_SIZE:
+            _TABLE_CACHE.pop(next(iter(_TABLE_CACHE)))
+        _TABLE_CACHE[key] = tables
+    return tables
@@ -0,0 +1,135 @@
+import time
+import traceback
+import numpy as np
+from multiprocessing import Process, Queue
+from queue import Empty
+from pymoo.core.population import Population
+
+from Parallel import SharedArrays, attach_shared_arrays, ArrayProblem, nsga2_algorithm, non_dominated_front
+
+# an island model runs several NSGA-II populations ("islands") side by side in separate processes; every few generations
+# each island sends some of its non-dominated solutions to its neighbouring islands, which lets good solutions spread
+# while the islands still explore different parts of the search space
+
+TOPOLOGIES = ["ring", "fully_connected"]
+MIGRATION_TIMEOUT = 600  # the number of seconds an island waits for migrants before it gives up
+
+
+def migration_targets(topology, number_islands):  # the islands each island sends its migrants to
+    if topology == "ring":
+        return [[(island + 1) % number_islands] for island in range(0, number_islands)]
+    if topology == "fully_connected":
+        return [[other for other in range(0, number_islands) if other != island] for island in range(0, number_islands)]
+    raise ValueError("Topology is not present in list.")
+
+
+def _migrate(algorithm, island, round_number, targets, number_sources, inboxes, pending, migration_size, rng):
+    # send up to migration_size randomly chosen non-dominated solutions to every target island, then wait for the
+    # migrants of this round from every source island; migrants that arrive early for a later round are kept in pending
+    front = algorithm.opt.get("X")
+    migrants = front[rng.choice(len(front), min(migration_size, len(front)), replace=False)]
+    for target in targets:
+        inboxes[target].put((round_number, migrants))
+
+    while len(pending.get(round_number, [])) < number_sources:
+        arrived_round, arrived = inboxes[island].get(timeout=MIGRATION_TIMEOUT)
+        pending.setdefault(arrived_round, []).append(arrived)
+    received = np.concatenate(pending.pop(round_number), axis=0)
+
+    # the migrants are evaluated on this island and compete with the current population for survival
+    incoming = algorithm.eliminate_duplicates.do(Population.new("X", received), algorithm.pop)
+    if len(incoming) > 0:
+        algorithm.evaluator.eval(algorithm.problem, incoming)
+        algorithm.pop = algorithm.survival.do(algorithm.problem, Population.merge(algorithm.pop, incoming),
+                                              n_survive=algorithm.pop_size)
+    return len(migrants) * len(targets), len(incoming)
+
+
+def _run_island(island, descriptors, configuration, targets, number_sources, inboxes, results):
+    try:
+        start_time = time.time()
+        arrays, blocks = attach_shared_arrays(descriptors)
+        algorithm = nsga2_algorithm(configuration["population_size"])
+        algorithm.setup(ArrayProblem(arrays), termination=('n_gen', configuration["generations"]),
+                        seed=configuration["seed"])
+        rng = np.random.default_rng(configuration["seed"])
+
+        pending = dict()
+        migrants_sent, migrants_received, round_number = 0, 0, 0
+        while algorithm.has_next():
+            algorithm.next()
+            if algorithm.n_gen % configuration["migration_interval"] == 0 and algorithm.has_next():
+                sent, received = _migrate(algorithm, island, round_number, targets, number_sources, inboxes, pending,
+                                          configuration["migration_size"], rng)
+                migrants_sent, migrants_received, round_number = migrants_sent + sent, migrants_received + received, \
+                    round_number + 1
+
+        X, F = algorithm.pop.get("X", "F")
+        front_F = algorithm.opt.get("F")
+        statistics = {"island": island, "seed": configuration["seed"], "generations": algorithm.n_gen,
+                      "evaluations": algorithm.evaluator.n_eval, "migrations": round_number,
+                      "migrants_sent": migrants_sent, "migrants_received": migrants_received,
+                      "front_size": len(front_F), "min_water_usage": float(np.min(front_F[:, 0])),
+                      "min_cost": float(np.min(front_F[:, 1])), "seconds": time.time() - start_time}
+        results.put((island, X.astype(int), F, statistics, None))
+        for block in blocks:
+            block.close()
+    except Exception:
+        results.put((island, None, None, None, traceback.format_exc()))
+
+
+def run_islands(arrays, number_islands, population_size, generations, migration_interval=10, migration_size=5,
+                topology="ring", seed=1):
+    # runs the island model and returns the final population and statistics of every island, together with the
+    # non-dominated front of all islands combined; island i uses the random seed seed + i
+    targets = migration_targets(topology, number_islands)
+    number_sources = [sum([island in island_targets for island_targets in targets])
+                      for island in range(0, number_islands)]
+    inboxes = [Queue() for _ in range(0, number_islands)]
+    results = Queue()
+
+    with SharedArrays(arrays) as shared:
+        processes = []
+        for island in range(0, number_islands):
+            configuration = {"seed": seed + island, "population_size": population_size, "generations": generations,
+                             "migration_interval": migration_interval, "migration_size": migration_size}
+            processes.append(Process(target=_run_island, args=(island, shared.descriptors, configuration,
+                                                               targets[island], number_sources[island], inboxes,
+                                                               results)))
+        for process in processes:
+            process.start()
+
+        islands = [None] * number_islands
+        try:
+            for _ in range(0, number_islands):
+                island, X, F, statistics, error = _next_result(results, processes)
+                if error is not None:
+                    raise RuntimeError("Island %d failed:\n%s" % (island, error))
+                islands[island] = {"X": X, "F": F, "statistics": statistics}
+        finally:
+            for process in processes:
+                if process.is_alive() and any(island is None for island in islands):
+                    process.terminate()
+                process.join()
+
+    front = non_dominated_front(np.concatenate([result["X"] for result in islands]),
+                                np.concatenate([result["F"] for result in islands]))
+    return islands, front
+
+
+def _next_result(results, processes):  # wait for the next island to finish, noticing islands that died without
+    # reporting back
+    while True:
+        try:
+            return results.get(timeout=1)
+        except Empty:
+            if not all(process.is_alive() for process in processes) and results.empty():
+                finished = [process for process in processes if not process.is_alive()]
+                if any(process.exitcode != 0 for process in finished):
+                    raise RuntimeError("An island process exited unexpectedly.")
+
+
+def save_island_statistics(islands, path):  # write the statistics of every island as a csv file with a header row
+    keys = list(islands[0]["statistics"].keys())
+    rows = np.array([[island["statistics"][key] for key in keys] for island in islands], dtype=float)
+    np.savetxt(path, rows, delimiter=",", header=",".join(keys), comments="", fmt="%.10g")
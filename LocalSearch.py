@@ -0,0 +1,219 @@
+import numpy as np
+from collections import deque
+from pymoo.core.callback import Callback
+
+from Objectives import connection_factor
+
+
+class IncrementalEvaluator:
+    # this class holds one assignment of irrigation techniques to counties together with the connected blocks of every
+    # technique and the running totals of both objectives; changing the technique of a single county then only requires
+    # looking at that county and its neighbours instead of re-evaluating the whole solution
+    def __init__(self, county_map, county_water, county_acreage, efficiency_table, cost_table):
+        self.county_water = county_water  # water needed by each county before technique efficiency
+        self.county_acreage = county_acreage  # acres planted in each county
+        self.efficiency_table = efficiency_table  # (n_counties x n_techniques) efficiency factors
+        self.cost_table = cost_table  # (n_counties x n_techniques) implementation cost per acre
+        self.NUMBER_TECHNIQUES = efficiency_table.shape[1]
+
+        # we store the neighbours of every county as python lists, since single counties are looked up one at a time
+        self.neighbours = [county_map.neighbours(county).tolist() for county in range(0, len(county_map.COUNTY_LIST))]
+
+        self.techniques = []  # the technique currently assigned to every county
+        self.labels = []  # the connected block every county belongs to; a block only ever contains one technique
+        self.members = dict()  # the counties contained in every block, keyed by block label
+        self.next_label = 0
+        self.num_components = 0  # the total number of connected blocks over all techniques
+        self.total_water = 0.0  # f_w(l) of the current assignment
+        self.total_base_cost = 0.0  # f_c(l) of the current assignment before it is multiplied by d(l)
+
+    def reset(self, county_techniques):  # load a full assignment and compute everything from scratch
+        self.techniques = [int(technique) for technique in county_techniques]
+        self.labels = [-1] * len(self.techniques)
+        self.members = dict()
+        self.next_label = 0
+        self.num_components = 0
+        for county in range(0, len(self.techniques)):
+            if self.labels[county] == -1:  # every county that is not yet labelled starts a new block
+                block = self._new_block({county})
+                queue = deque([county])
+                while queue:  # breadth first search over neighbours using the same technique
+                    current = queue.popleft()
+                    for neighbour in self.neighbours[current]:
+                        if self.labels[neighbour] == -1 and self.techniques[neighbour] == self.techniques[county]:
+                            self.labels[neighbour] = block
+                            self.members[block].add(neighbour)
+                            queue.append(neighbour)
+
+        counties = np.arange(0, len(self.techniques))
+        self.total_water = float(np.sum(self.county_water / self.efficiency_table[counties, self.techniques]))
+        self.total_base_cost = float(np.sum(self.county_acreage * self.cost_table[counties, self.techniques]))
+
+    def objectives(self):  # the current values of f_w and f_c
+        return np.array([self.total_water, self.total_base_cost * connection_factor(self.num_components)])
+
+    def flip(self, county, technique):  # change the technique of a single county and return the new objectives
+        old_technique = self.techniques[county]
+        if technique != old_technique:
+            self._remove_from_block(county)
+            self.techniques[county] = technique
+            self._add_to_block(county)
+
+            self.total_water += self.county_water[county] * (1 / self.efficiency_table[county, technique] -
+                                                             1 / self.efficiency_table[county, old_technique])
+            self.total_base_cost += self.county_acreage[county] * (self.cost_table[county, technique] -
+                                                                   self.cost_table[county, old_technique])
+
+        return self.objectives()
+
+    def _new_block(self, counties):
+        label = self.next_label
+        self.next_label += 1
+        self.members[label] = counties
+        for county in counties:
+            self.labels[county] = label
+        self.num_components += 1
+        return label
+
+    def _add_to_block(self, county):
+        # the county joins every neighbouring block with the same technique, which are merged into the largest one
+        technique = self.techniques[county]
+        touching = {self.labels[neighbour] for neighbour in self.neighbours[county]
+                    if self.techniques[neighbour] == technique}
+        if not touching:
+            self._new_block({county})
+            return
+
+        target = max(touching, key=lambda label: len(self.members[label]))
+        for label in touching:
+            if label != target:
+                for member in self.members[label]:
+                    self.labels[member] = target
+                self.members[target] |= self.members.pop(label)
+                self.num_components -= 1
+        self.labels[county] = target
+        self.members[target].add(county)
+
+    def _remove_from_block(self, county):
+        # removing a county can split its block; the neighbours in the same block are used as starting points of
+        # searches that run side by side, so only the pieces that break off have to be explored completely
+        label = self.labels[county]
+        self.members[label].discard(county)
+        self.labels[county] = -1
+        starts = [neighbour for neighbour in self.neighbours[county] if self.labels[neighbour] == label]
+        if not starts:  # the county was a block of its own
+            del self.members[label]
+            self.num_components -= 1
+            return
+        if len(starts) == 1:  # a single neighbour in the block cannot be cut off from the rest
+            return
+
+        for piece in self._split_pieces(starts, label):
+            self.members[label] -= piece
+            self._new_block(piece)
+
+    def _split_pieces(self, starts, label):
+        owner = {start: group for group, start in enumerate(starts)}  # which search reached each county first
+        parent = list(range(0, len(starts)))  # searches that meet are merged, this tracks which one they merged into
+        visited = [{start} for start in starts]
+        queues = [deque([start]) for start in starts]
+        running = set(range(0, len(starts)))  # searches that still have counties left to explore
+        finished = []  # searches that ran out of counties without meeting the others; each is a separate piece
+
+        def find(group):
+            while parent[group] != group:
+                group = parent[group]
+            return group
+
+        while len(running) > 1:
+            for group in list(running):
+                if group not in running:  # this search was merged into another one during this round
+                    continue
+                if not queues[group]:
+                    running.discard(group)
+                    finished.append(group)
+                    if len(running) <= 1:
+                        break
+                    continue
+
+                current = queues[group].popleft()
+                for neighbour in self.neighbours[current]:
+                    if self.labels[neighbour] != label:
+                        continue
+                    other = owner.get(neighbour)
+                    if other is None:
+                        owner[neighbour] = group
+                        visited[group].add(neighbour)
+                        queues[group].append(neighbour)
+                        continue
+                    other = find(other)
+                    if other != group:  # the two searches are in the same piece, so the smaller one is folded in
+                        parent[other] = group
+                        visited[group] |= visited[other]
+                        queues[group].extend(queues[other])
+                        visited[other], queues[other] = set(), deque()
+                        running.discard(other)
+                if len(running) <= 1:
+                    break
+
+        return [visited[group] for group in finished]
+
+
+def dominates(first_objectives, second_objectives):  # whether the first objective vector Pareto-dominates the second
+    return bool(np.all(first_objectives <= second_objectives) and np.any(first_objectives < second_objectives))
+
+
+def hill_climb(evaluator, county_techniques, max_passes=1, rng=None):
+    # starting from county_techniques, we visit counties in random order and try every other technique for each; a
+    # change is kept if the new objectives dominate the current ones, and the passes stop once nothing improves
+    rng = np.random.default_rng() if rng is None else rng
+    evaluator.reset(county_techniques)
+    current_objectives = evaluator.objectives()
+    for _ in range(0, max_passes):
+        improved = False
+        for county in rng.permutation(len(evaluator.techniques)):
+            current_technique = evaluator.techniques[county]
+            for technique in range(0, evaluator.NUMBER_TECHNIQUES):
+                if technique == current_technique:
+                    continue
+                new_objectives = evaluator.flip(county, technique)
+                if dominates(new_objectives, current_objectives):
+                    current_objectives, improved = new_objectives, True
+                    break
+                evaluator.flip(county, current_technique)  # undo the change
+        if not improved:
+            break
+
+    return np.array(evaluator.techniques), current_objectives
+
+
+def refine_population(evaluator, population_techniques, max_passes=1, rng=None):  # hill climb every solution of a
+    # (pop_size x n_counties) population and return the refined solutions and their objectives
+    rng = np.random.default_rng() if rng is None else rng
+    refined = [hill_climb(evaluator, county_techniques, max_passes, rng) for county_techniques in population_techniques]
+    return np.stack([x for x, f in refined]), np.stack([f for x, f in refined])
+
+
+class LocalSearchCallback(Callback):
+    # pymoo callback that hill climbs part of the population after every `every` generations, turning NSGA-II into a
+    # memetic algorithm; n_individuals limits how many randomly chosen solutions are refined each time
+    def __init__(self, evaluator, every=1, n_individuals=None, max_passes=1, seed=None):
+        super().__init__()
+        self.evaluator = evaluator
+        self.every = every
+        self.n_individuals = n_individuals
+        self.max_passes = max_passes
+        self.rng = np.random.default_rng(seed)
+
+    def notify(self, algorithm, **kwargs):
+        if algorithm.n_gen % self.every != 0:
+            return
+        population = algorithm.pop
+        chosen = np.arange(0, len(population))
+        if self.n_individuals is not None and self.n_individuals < len(population):
+            chosen = self.rng.choice(len(population), self.n_individuals, replace=False)
+
+        X, F = refine_population(self.evaluator, population.get("X")[chosen], self.max_passes, self.rng)
+        for k, i in enumerate(chosen):
+            population[i].set("X", X[k].astype(population[i].X.dtype))
+            population[i].set("F", F[k])
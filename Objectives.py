@@ -1,21 +1,21 @@
 import numpy as np
-from IrrigationTechniques import CenterPivotIrrigation, SprinklerIrrigation, DripIrrigation, FurrowIrrigation
+from IrrigationTechniques import TECHNIQUE_REGISTRY, technique_tables
+
+TECHNIQUE_CLASS_MAPPING = TECHNIQUE_REGISTRY  # technique index -> irrigation technique class, see register_technique
 
 
 def water_usage(county_crops, county_techniques, county_gradients):
-    TECHNIQUE_CLASS_MAPPING = [CenterPivotIrrigation, SprinklerIrrigation, DripIrrigation, FurrowIrrigation]
+    # the efficiency of every technique in every county is looked up in the tables of technique_tables, which are
+    # computed once for county_gradients instead of creating an irrigation technique object for every county
+    efficiencies, _ = technique_tables(county_gradients)
     total_water_usage = 0
     for i in range(0, len(county_crops)):
         current_county_crops = county_crops[i]
-        # we use TECHNIQUE_CLASS_MAPPING to store the class signatures and instantiate an object in technique using
-        # that mapping so that the appropriate irrigation technique class object can be assigned for the respective
-        # county
-        technique = TECHNIQUE_CLASS_MAPPING[county_techniques[i]](owning_county=i,
-                                                                  gradient_angle=county_gradients[i])
+        efficiency_factor = efficiencies[i, county_techniques[i]]
 
         # using our definition for f_w(l), we sum over all water needed for each crop in each county
         for crop in current_county_crops:
-            total_water_usage += crop.water_usage() / technique.efficiency_factor()
+            total_water_usage += crop.water_usage() / efficiency_factor
 
     return total_water_usage
 
@@ -27,15 +27,10 @@ def connection_factor(num_connected_technique_components):  # this utility funct
 
 
 def technique_cost(county_crops, county_techniques, county_gradients, num_connected_technique_components):
-    TECHNIQUE_CLASS_MAPPING = [CenterPivotIrrigation, SprinklerIrrigation, DripIrrigation, FurrowIrrigation]
+    _, costs = technique_tables(county_gradients)  # implementation cost per acre of every technique in every county
     total_implementation_cost = 0
     for i in range(0, len(county_crops)):
         current_county_crops = county_crops[i]
-        # we use TECHNIQUE_CLASS_MAPPING to store the class signatures and instantiate an object in technique using
-        # that mapping so that the appropriate irrigation technique class object can be assigned for the respective
-        # county
-        technique = TECHNIQUE_CLASS_MAPPING[county_techniques[i]](owning_county=i,
-                                                                  gradient_angle=county_gradients[i])
 
         # using our definition for f_c(l), we sum over the total cost for irrigation technique technology for each crop
         # in each county
@@ -43,9 +38,27 @@ def technique_cost(county_crops, county_techniques, county_gradients, num_connec
         for crop in current_county_crops:
             total_crop_area += crop.acres_planted
 
-        total_implementation_cost += technique.IMPLEMENTATION_COST_PER_ACRE * total_crop_area
+        total_implementation_cost += costs[i, county_techniques[i]] * total_crop_area
 
     return total_implementation_cost * connection_factor(num_connected_technique_components)
 
 
+# the following functions are used for evaluating a whole population of solutions at once; the per-county data that
+# never changes during a run (water needed, acres planted, efficiency and cost of every technique) is precomputed into
+# numpy arrays so that the objectives for a population can be calculated with array operations instead of loops
+
+def water_usage_batch(county_water, efficiency_table, population_techniques):
+    # population_techniques is a (pop_size x n_counties) array of technique indices; we look up the efficiency of the
+    # chosen technique for every county of every solution and sum f_w(l) across counties
+    population_techniques = np.asarray(population_techniques, dtype=int)
+    efficiencies = efficiency_table[np.arange(efficiency_table.shape[0]), population_techniques]
+    return np.sum(county_water / efficiencies, axis=-1)
+
 
+def technique_cost_batch(county_acreage, cost_table, population_techniques, num_connected_technique_components):
+    # same as technique_cost, but for a whole population; num_connected_technique_components holds one component
+    # count per solution
+    population_techniques = np.asarray(population_techniques, dtype=int)
+    costs = cost_table[np.arange(cost_table.shape[0]), population_techniques]
+    total_implementation_cost = np.sum(costs * county_acreage, axis=-1)
+    return total_implementation_cost * connection_factor(np.asarray(num_connected_technique_components))
@@ -1,108 +1,480 @@
 # these are our standard imports; numpy is used for mathematical and tensor calculations, while pymoo is a library for
-# multi-objective optimization
+# multi-objective optimization; nothing is loaded or run when this file is imported, see main() for the command line
+# interface (python Optimizer.py run|evaluate|depletion|exact|animate|plot)
+import os
+import sys
+import time
+import argparse
 import numpy as np
-import copy
 from pymoo.core.problem import ElementwiseProblem
-from pymoo.algorithms.moo.nsga2 import NSGA2
-from pymoo.factory import get_sampling, get_crossover, get_mutation
-from pymoo.visualization.scatter import Scatter
 from pymoo.optimize import minimize
-import matplotlib.pyplot as plt
-import tqdm
-import imageio
 
-from Crops import crop_class_loader  # import the data loader for crop data by county (acres planted, yield, type, etc.)
+from Crops import crop_table_loader  # import the data loader for crop data by county (acres planted, yield, type, etc.)
 from Gradient import gradient_loader  # import the data loader for gradient data by county
 from CountyMap import CountyMap  # import the county_map class for storing our irrigation technique data, finding
 # connected components, and plotting
 from Objectives import water_usage, technique_cost  # import objective functions for optimization
+from EvaluationCache import EvaluationCache, CachedProblem, dataset_fingerprint  # import the cache of objective
+# values for solutions that were already evaluated
+from Parallel import nsga2_algorithm, problem_arrays, evaluate_population, ArrayProblem, ParallelProblem, run_many, \
+    non_dominated_front  # import the NSGA-II configuration, the batched problem and the tools for evaluating
+# populations and running several optimizations in parallel
+from Islands import run_islands, save_island_statistics  # import the island model
+from RunHistory import RunRecorder, run_recorded, CallbackChain  # import the recorder for run history and checkpoints
+from Profiling import Profiler, ProfilingCallback  # import the profiler that times the phases of a run
+from ExactFront import exact_pareto_front, front_distance  # import the exact solver for small regions
+from IrrigationTechniques import technique_names, technique_colors  # import the registry of irrigation techniques
+from Projections import depletion_horizons, usage_percent  # import the aquifer depletion model
+from Rendering import MapRenderer, animate, generation_frames, solution_frames, ANIMATION_FILE, FRAME_DIRECTORY, \
+    RENDER_PROCESSES  # import the renderer of animations
+from Scenarios import sample_scenarios, robust_objectives, ScenarioProblem, RISK_MEASURES, CVAR_ALPHA  # import the
+# scenarios used for robust optimization
+from LocalSearch import IncrementalEvaluator, LocalSearchCallback, refine_population  # import the incremental
+# evaluator and hill climbing used to refine solutions found by NSGA-II
 
-county_map = CountyMap()
-county_map.load_counties("./data/CountyMapData.xlsx")  # load county list and data into county_map
-county_map.load_connections("./data/CountyMapData.xlsx")  # load data of borders/graph connections between counties
+TECHNIQUES = technique_names()  # technique index -> name, for every technique registered in IrrigationTechniques.py
+NODE_COLORS = technique_colors()  # technique index -> plot color
 
-TECHNIQUES = {0: "Center Pivot Irrigation",
-              1: "Sprinkler Irrigation",
-              2: "Drip Irrigation",
-              3: "Furrow Irrigation"}
+WATER_COST_PER_GALLON = 0.0025379
 
-NODE_COLORS = {0: "red",
-               1: "green",
-               2: "purple",
-               3: "blue"}
+# the following constants are the default settings of run()
+DATA_DIRECTORY = "./data"  # the directory holding CountyMapData.xlsx, CropData.xlsx and Gradients.xlsx
+POPULATION_SIZE = 100
+GENERATIONS = 200
+BATCHED_EVALUATION = True  # if True, the whole population is evaluated at once with TechniqueBatchProblem; otherwise
+# each solution is evaluated one at a time with TechniqueProblem
+REFINE_FINAL_POPULATION = False  # if True, every solution in the final population is improved by hill climbing and
+# only the non-dominated solutions are saved; otherwise the whole final population is saved
+MEMETIC_LOCAL_SEARCH = False  # if True, hill climbing is also applied to the population after every generation
+LOCAL_SEARCH_PASSES = 1  # the maximum number of passes over all counties that hill climbing makes per solution
+MEMOIZE_EVALUATIONS = True  # if True, objective values are cached so that repeated solutions are not re-evaluated
+# (single runs only)
+EVALUATION_CACHE_SIZE = 100000  # the maximum number of solutions kept in the cache
+EVALUATION_CACHE_FILE = None  # if set (e.g. "./evaluation_cache.npz"), the cache is loaded from and saved to this file
+# so that it is kept between runs
+EVALUATION_PROCESSES = 1  # the number of processes each population is evaluated with; 1 evaluates in this process
+SEEDS = [1]  # the random seeds to run the optimization with; with more than one seed, a run is made for every seed in
+# parallel and the non-dominated solutions of all runs are saved
+RUN_PROCESSES = None  # the number of processes used for the runs of different seeds; None uses every core
+ISLANDS = 1  # with more than one island, the island model is used: each island is a population of POPULATION_SIZE
+# running in its own process, and island i uses the seed SEEDS[0] + i
+MIGRATION_INTERVAL = 10  # islands exchange solutions every MIGRATION_INTERVAL generations
+MIGRATION_SIZE = 5  # the number of non-dominated solutions an island sends to each of its neighbours
+MIGRATION_TOPOLOGY = "ring"  # "ring" sends migrants to the next island, "fully_connected" sends them to all islands
+RUN_DIRECTORY = "./run"  # the history of every generation, the archive of non-dominated solutions and checkpoints
+# are written to this directory; None disables this; runs with several seeds or islands are not recorded
+CHECKPOINT_EVERY = 10  # the algorithm is checkpointed every CHECKPOINT_EVERY generations
+RESUME = False  # if True, the run continues from the last checkpoint in RUN_DIRECTORY
+SOLUTION_FILE = "solution.csv"  # the final solutions are saved here, one per row as f_w, f_c and the techniques
+ISLAND_STATISTICS_FILE = "island_statistics.csv"  # the statistics of every island are saved here
+EXACT_SOLUTION_FILE = "exact_solution.csv"  # the exact Pareto front is saved here, in the format of SOLUTION_FILE
+PROFILE_DIRECTORY = None  # if set, a single run is profiled and the time spent in each phase is written here
+ROBUST_SCENARIOS = 0  # with more than zero, a single run optimizes the objectives over this many sampled yield and
+# gradient scenarios (see Scenarios.py) instead of over the values in the data files
+RISK_MEASURE = "cvar"  # how the objectives are measured over the scenarios: "expected" or "cvar" (the mean of the
+# worst 1 - CVAR_ALPHA of the scenarios)
+SCENARIO_SEED = 1  # the random seed the scenarios are sampled with
 
-WATER_COST_PER_GALLON = 0.0025379
 
-county_map.load_techniques(TECHNIQUES)  # populate county_map with necessary constants
-county_map.load_node_colors(NODE_COLORS)
+class Dataset:
+    # the county map, crops and gradients of a region, loaded from the xlsx files in data_directory
+    def __init__(self, data_directory=DATA_DIRECTORY):
+        county_map = CountyMap()
+        county_map.load_counties(os.path.join(data_directory, "CountyMapData.xlsx"))  # load county list and data into
+        # county_map
+        county_map.load_connections(os.path.join(data_directory, "CountyMapData.xlsx"))  # load data of borders/graph
+        # connections between counties
+        self._prepare(county_map,
+                      crop_table_loader(os.path.join(data_directory, "CropData.xlsx")),  # load the table of crops for
+                      # each county
+                      gradient_loader(os.path.join(data_directory, "Gradients.xlsx")))  # load gradient angles for
+                      # each county
 
-NUMBER_COUNTIES = len(county_map.COUNTY_LIST)
+    @classmethod
+    def from_data(cls, county_map, crop_table, county_gradients):  # a dataset from data that is already loaded (or
+        # generated, as for benchmarks)
+        dataset = cls.__new__(cls)
+        dataset._prepare(county_map, crop_table, county_gradients)
+        return dataset
 
-county_crops = crop_class_loader(source_xlsx="./data/CropData.xlsx")  # load classes for each crop for each county
-county_gradients = gradient_loader(source_xlsx="./data/Gradients.xlsx")  # load gradient angles for each county
+    def _prepare(self, county_map, crop_table, county_gradients):
+        self.county_map = county_map
+        self.county_map.load_techniques(TECHNIQUES)  # populate county_map with necessary constants
+        self.county_map.load_node_colors(NODE_COLORS)
+        self.crop_table = crop_table
+        self.county_gradients = county_gradients
+        self.arrays = problem_arrays(self.county_map, self.crop_table, self.county_gradients)  # the county data
+        # needed to evaluate solutions
+        self._county_crops = None
 
-POPULATION_SIZE = 100
-GENERATIONS = 200
+    def sample_scenarios(self, number_scenarios, seed=SCENARIO_SEED):  # yield and gradient scenarios of this region
+        return sample_scenarios(self.crop_table, self.county_gradients, number_scenarios, seed=seed)
+
+    @property
+    def NUMBER_COUNTIES(self):
+        return len(self.county_map.COUNTY_LIST)
+
+    @property
+    def county_crops(self):  # crop objects for each county, which view the rows of crop_table; these are only needed by
+        # TechniqueProblem, so they are created the first time they are used
+        if self._county_crops is None:
+            self._county_crops = self.crop_table.county_crops()
+        return self._county_crops
 
 
 class TechniqueProblem(ElementwiseProblem):
-    # define problem class for the pymoo library to solve; this class inherits from ElementwiseProblem as we chose to
-    # evaluate one solution at a time instead of multithreading the solution process
-    def __init__(self):
+    # define problem class for the pymoo library to solve; this class inherits from ElementwiseProblem so that it
+    # evaluates one solution at a time
+    def __init__(self, dataset):
         super().__init__(
-            n_var=NUMBER_COUNTIES,  # each county's irrigation technique is represented as a variable
+            n_var=dataset.NUMBER_COUNTIES,  # each county's irrigation technique is represented as a variable
             n_obj=2,  # we have two objectives, water usage and cost
             n_constr=0,  # there are no constraints needed for our problem
             xl=0,  # the minimum value for our variables is 0 (this corresponds to T_1, but the code is 0-indexed)
-            xu=3,  # the maximum value for our variables is 3 (this corresponds to T_4, but the code is 0-indexed)
+            xu=len(TECHNIQUES) - 1,  # the maximum value for our variables is 3 (this corresponds to T_4, but the code
+            # is 0-indexed), or one less than the number of registered techniques
             type_var=int  # because our variables are just classifiers for irrigation techniques, they should be
             # restricted to integers, (0 -> T_1, 1 -> T_2, 2 -> T_3, 3 -> T_4)
         )
+        self.dataset = dataset
 
     def _evaluate(self, x, out, *args, **kwargs):
         # _evaluate is called every time the objectives need to be evaluated for a solution x; out is a dictionary
         # containing the objective function values
-        for i in range(0, len(x)):
-            county_map.assign_technique_to_county(i, x[i])  # assign the solution's set of irrigation techniques to all
-                                                            # counties in county_map
-
-        f_w = water_usage(county_crops, x, county_gradients)  # evaluate water usage
-        f_c = technique_cost(county_crops, x, county_gradients,  # evaluate cost;
-                             np.sum([len([comp for comp in county_map.connected_components_by_technique(technique)])
-                                     for technique, description in TECHNIQUES.items()]))
+        f_w = self.water_usage(x)  # evaluate water usage
+        f_c = self.technique_cost(x, np.sum(self.components(x)))  # evaluate cost;
         # note that the last argument supplied in technique_cost for the number of connected blocks of irrigation
-        # techniques is derived from a list comprehension which sums the lengths of all connected blocks of counties for
-        # all irrigation techniques in county_map
+        # techniques is the sum of the number of connected blocks of counties for all irrigation techniques
 
         out["F"] = [f_w, f_c]  # store objective values in the dictionary out
         out["G"] = []  # store constraint values in the dictionary out, which are blank as we have 0 constraints
 
+    # the phases of an evaluation are separate methods so that they can be timed when a run is profiled
+    PHASES = ["components", "water_usage", "technique_cost"]
+
+    def components(self, x):  # the number of connected blocks of counties of every technique
+        return self.dataset.county_map.count_components_by_technique(x)
+
+    def water_usage(self, x):
+        return water_usage(self.dataset.county_crops, x, self.dataset.county_gradients)
+
+    def technique_cost(self, x, num_components):
+        return technique_cost(self.dataset.county_crops, x, self.dataset.county_gradients, num_components)
+
+
+class TechniqueBatchProblem(ArrayProblem):
+    # this is the same problem as TechniqueProblem, but batched (see ArrayProblem in Parallel.py), so that the whole
+    # population is evaluated at once from per-county data that is precomputed once when the dataset is loaded
+    def __init__(self, dataset):
+        super().__init__(dataset.arrays)
+        self.dataset = dataset
+
+
+def evaluate(dataset, population_techniques):  # f_w and f_c of every solution in a (pop_size x n_counties) array
+    return evaluate_population(dataset.arrays, np.atleast_2d(population_techniques))
+
+
+def evaluate_robust(dataset, population_techniques, number_scenarios, alpha=CVAR_ALPHA, seed=SCENARIO_SEED):
+    # the expected value and the conditional value at risk of f_w and f_c of every solution, as a (pop_size x 4) array
+    objectives = robust_objectives(dataset.arrays, dataset.sample_scenarios(number_scenarios, seed),
+                                   np.atleast_2d(population_techniques), alpha)
+    return np.column_stack([objectives["expected"], objectives["cvar"]])
+
+
+def run(dataset, population_size=POPULATION_SIZE, generations=GENERATIONS, seeds=SEEDS,
+        batched_evaluation=BATCHED_EVALUATION, evaluation_processes=EVALUATION_PROCESSES, run_processes=RUN_PROCESSES,
+        islands=ISLANDS, migration_interval=MIGRATION_INTERVAL, migration_size=MIGRATION_SIZE,
+        migration_topology=MIGRATION_TOPOLOGY, memoize_evaluations=MEMOIZE_EVALUATIONS,
+        evaluation_cache_size=EVALUATION_CACHE_SIZE, evaluation_cache_file=EVALUATION_CACHE_FILE,
+        run_directory=RUN_DIRECTORY, checkpoint_every=CHECKPOINT_EVERY, resume=RESUME,
+        refine_final_population=REFINE_FINAL_POPULATION, memetic_local_search=MEMETIC_LOCAL_SEARCH,
+        local_search_passes=LOCAL_SEARCH_PASSES, island_statistics_file=ISLAND_STATISTICS_FILE,
+        profile_directory=PROFILE_DIRECTORY, robust_scenarios=ROBUST_SCENARIOS, risk_measure=RISK_MEASURE,
+        cvar_alpha=CVAR_ALPHA, scenario_seed=SCENARIO_SEED, statistics=None):
+    # runs the optimization on dataset and returns the techniques (final_X) and objective values (final_F) of the final
+    # solutions; the settings are described with the constants of the same name at the top of this file; if statistics
+    # is a dictionary, the statistics of the evaluation cache ("evaluation_cache") and the profile summary ("profile")
+    # of the run are added to it
+    arrays = dataset.arrays
+    evaluator = IncrementalEvaluator(dataset.county_map,  # create the incremental evaluator used for hill climbing
+                                     arrays["county_water"],
+                                     arrays["county_acreage"],
+                                     arrays["efficiency_table"],
+                                     arrays["cost_table"])
+    if profile_directory is not None and (islands > 1 or len(seeds) > 1):  # the processes of these runs are not
+        # profiled
+        raise ValueError("Only a single run with one seed can be profiled.")
+    if islands > 1 or len(seeds) > 1:  # these settings only apply to a single run in this process; the defaults of
+        # run_directory and memoize_evaluations are simply not used by these runs, but asking for anything else is an
+        # error rather than being ignored
+        unsupported = [name for name, requested in [("run_directory", run_directory not in (None, RUN_DIRECTORY)),
+                                                    ("resume", resume),
+                                                    ("evaluation_cache_file", evaluation_cache_file is not None),
+                                                    ("memetic_local_search", memetic_local_search),
+                                                    ("evaluation_processes", evaluation_processes > 1)] if requested]
+        if unsupported:
+            raise ValueError("%s can only be used for a single run with one seed." % ", ".join(unsupported))
+    profiler = Profiler() if profile_directory is not None else None
+    scenarios = None
+    if robust_scenarios > 0:  # the other processes and the hill climbing only evaluate the objectives of the data files
+        if islands > 1 or len(seeds) > 1 or evaluation_processes > 1 or memetic_local_search:
+            raise ValueError("Robust optimization is only available for a single run evaluated in this process.")
+        scenarios = dataset.sample_scenarios(robust_scenarios, scenario_seed)  # sampled once and used for every
+        # generation
+        refine_final_population = False
+
+    if islands > 1:  # run the island model and merge the non-dominated solutions of all islands into a single front
+        island_results, (final_X, final_F) = run_islands(arrays, islands, population_size, generations,
+                                                         migration_interval, migration_size, migration_topology,
+                                                         seeds[0])
+        if island_statistics_file is not None:
+            save_island_statistics(island_results, island_statistics_file)
+    elif len(seeds) > 1:  # run one optimization per seed in separate processes and merge the non-dominated solutions of
+                          # all runs into a single front
+        runs, (final_X, final_F) = run_many(arrays, [{"seed": seed, "population_size": population_size,
+                                                      "generations": generations} for seed in seeds], run_processes)
+    else:
+        algorithm = nsga2_algorithm(population_size)  # initialize an instance of the NSGA-II algorithm
+
+        if scenarios is not None:  # create an instance of our problem class
+            problem = ScenarioProblem(arrays, scenarios, risk_measure, cvar_alpha)
+        elif evaluation_processes > 1:
+            problem = parallel_problem = ParallelProblem(arrays, evaluation_processes)
+        else:
+            problem = TechniqueBatchProblem(dataset) if batched_evaluation else TechniqueProblem(dataset)
+        if memoize_evaluations:  # wrap the problem so that solutions are looked up in the cache before being evaluated
+            fingerprint_arrays = list(arrays.values())
+            if scenarios is not None:  # robust objective values are only valid for the same scenarios and measure
+                fingerprint_arrays += list(scenarios.values()) + [np.array([RISK_MEASURES.index(risk_measure),
+                                                                            cvar_alpha])]
+            evaluation_cache = EvaluationCache(evaluation_cache_size, dataset_fingerprint(*fingerprint_arrays))
+            if evaluation_cache_file is not None:
+                evaluation_cache.load(evaluation_cache_file)
+            problem = CachedProblem(problem, evaluation_cache)
+
+        callback = LocalSearchCallback(evaluator, max_passes=local_search_passes, seed=1) if memetic_local_search \
+            else None
+        if profiler is not None:  # time the evaluations, the local search and (through profiling_callback) the phases
+            # of the NSGA-II loop
+            profiler.instrument_problem(problem)
+            if callback is not None:
+                profiler.instrument(callback, "notify", "local_search")
+            profiling_callback = ProfilingCallback(profiler, evaluation_cache if memoize_evaluations else None)
+            callback = CallbackChain(callback, profiling_callback)
+        on_start = profiling_callback.attach if profiler is not None else None  # the phases are instrumented once
+        # the algorithm is set up (or resumed), so the first generation is timed as well
+        try:
+            if run_directory is not None:  # run the algorithm while streaming its history to run_directory
+                result = run_recorded(problem, algorithm, ('n_gen', generations), seeds[0],
+                                      RunRecorder(run_directory, checkpoint_every), callback, resume=resume,
+                                      on_start=on_start)
+            else:
+                algorithm.setup(
+                    problem,
+                    termination=('n_gen', generations),  # set to terminate after n_gen = generations
+                    seed=seeds[0],  # seed for random numbering, can be altered as desired
+                    callback=callback
+                )
+                if on_start is not None:
+                    on_start(algorithm)
+                result = minimize(problem, algorithm, copy_algorithm=False)  # run the minimize function using our
+                # algorithm and problem object; the algorithm was set up above, so it is not copied
+        finally:
+            if evaluation_processes > 1:
+                parallel_problem.close()  # stop the worker processes
+
+        final_X, final_F = result.pop.get("X"), result.pop.get("F")  # the population of the final generation
+
+        if memoize_evaluations:
+            if evaluation_cache_file is not None:
+                evaluation_cache.save(evaluation_cache_file)
+            if statistics is not None:
+                statistics["evaluation_cache"] = evaluation_cache.statistics()
+
+    if refine_final_population:  # polish the final solutions with hill climbing before saving them; solutions that
+        # climbed to the same point, or past each other, are removed so that only the non-dominated ones are kept
+        start_time = time.perf_counter()
+        final_X, final_F = non_dominated_front(*refine_population(evaluator, final_X, local_search_passes,
+                                                                  np.random.default_rng(1)))
+        if profiler is not None:
+            profiler.add_time("refine_final_population", time.perf_counter() - start_time)
+
+    if profiler is not None:
+        profiling_callback.save(profile_directory)
+        if statistics is not None:
+            statistics["profile"] = profiler.summary()
+
+    return np.asarray(final_X, dtype=int), np.asarray(final_F)
+
+
+def solve_exact(dataset, heuristic_X=None):
+    # computes the exact Pareto front of a small region as (X, F, statistics, distance); the solutions heuristic_X (e.g.
+    # found by run) speed up the search, and distance describes how far their non-dominated front is from the exact one
+    X, F, statistics = exact_pareto_front(dataset.arrays, heuristic_X)
+    distance = None
+    if heuristic_X is not None:
+        _, heuristic_F = non_dominated_front(heuristic_X, evaluate(dataset, heuristic_X))
+        distance = front_distance(F, heuristic_F)
+    return X, F, statistics, distance
+
+
+def save_solution(final_X, final_F, path=SOLUTION_FILE):
+    # acquire and sort our solutions based on f_c
+    sol_pop = np.column_stack([final_F, final_X])
+    sol_pop = sol_pop[np.argsort(sol_pop[:, 1])]
+
+    np.savetxt(path, sol_pop, delimiter=",")
+
+
+def load_solution(path, number_counties):
+    # reads the techniques of every solution from a csv file, which either holds only the techniques of each county or
+    # is a solution file written by save_solution (f_w, f_c and then the techniques)
+    rows = np.atleast_2d(np.loadtxt(path, delimiter=","))
+    if rows.shape[1] == number_counties + 2:
+        rows = rows[:, 2:]
+    if rows.shape[1] != number_counties:
+        raise ValueError("Solutions in %s do not have one technique per county." % path)
+    return rows.astype(int)
+
+
+def plot(dataset, county_techniques, kind="graph"):
+    # draws a solution, either as the county graph colored by technique ("graph") or as a choropleth map ("choropleth");
+    # the plotting libraries are only imported by CountyMap when this is called
+    for county, technique in enumerate(county_techniques):
+        dataset.county_map.assign_technique_to_county(county, int(technique))
+    if kind == "graph":
+        dataset.county_map.draw_graph_for_all_techniques()
+    elif kind == "choropleth":
+        dataset.county_map.county_choropleth_by_technique()
+    else:
+        raise ValueError("Plot kind is not present in list.")
+
+
+def animate_run(dataset, run_directory=RUN_DIRECTORY, solutions=None, output=ANIMATION_FILE, kind="graph", every=1,
+                frame_directory=FRAME_DIRECTORY, processes=RENDER_PROCESSES):
+    # renders the generations of a run recorded in run_directory, or the solutions of a solution file if solutions is
+    # given, and assembles them into an animation saved to output
+    renderer = MapRenderer(dataset.county_map, kind)
+    if solutions is not None:
+        X = load_solution(solutions, dataset.NUMBER_COUNTIES)
+        frames = solution_frames(X, evaluate(dataset, X))
+    else:
+        frames = generation_frames(run_directory, every)
+    return animate(renderer, frames, output, frame_directory, processes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Optimize irrigation techniques by county for water usage and cost.")
+    parser.add_argument("--data", default=DATA_DIRECTORY, help="directory holding the xlsx input files")
+    commands = parser.add_subparsers(dest="command")
+
+    run_parser = commands.add_parser("run", help="run the optimization and save the final solutions")
+    run_parser.add_argument("--output", default=SOLUTION_FILE)
+    run_parser.add_argument("--population-size", type=int, default=POPULATION_SIZE)
+    run_parser.add_argument("--generations", type=int, default=GENERATIONS)
+    run_parser.add_argument("--seeds", type=int, nargs="+", default=SEEDS)
+    run_parser.add_argument("--elementwise", action="store_true", default=not BATCHED_EVALUATION,
+                            help="evaluate one solution at a time with TechniqueProblem instead of whole populations")
+    run_parser.add_argument("--evaluation-processes", type=int, default=EVALUATION_PROCESSES)
+    run_parser.add_argument("--run-processes", type=int, default=RUN_PROCESSES)
+    run_parser.add_argument("--islands", type=int, default=ISLANDS)
+    run_parser.add_argument("--migration-interval", type=int, default=MIGRATION_INTERVAL)
+    run_parser.add_argument("--migration-size", type=int, default=MIGRATION_SIZE)
+    run_parser.add_argument("--migration-topology", choices=["ring", "fully_connected"], default=MIGRATION_TOPOLOGY)
+    run_parser.add_argument("--evaluation-cache-file", default=EVALUATION_CACHE_FILE)
+    run_parser.add_argument("--run-directory", default=RUN_DIRECTORY, help="an empty string disables the run history")
+    run_parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY)
+    run_parser.add_argument("--resume", action="store_true", default=RESUME)
+    run_parser.add_argument("--memetic", action="store_true", default=MEMETIC_LOCAL_SEARCH)
+    run_parser.add_argument("--refine", action="store_true", default=REFINE_FINAL_POPULATION,
+                            help="hill climb the final population and save only its non-dominated solutions")
+    run_parser.add_argument("--profile", default=PROFILE_DIRECTORY, help="write a profile of the run to this directory")
+    run_parser.add_argument("--scenarios", type=int, default=ROBUST_SCENARIOS,
+                            help="optimize over this many sampled yield and gradient scenarios")
+    run_parser.add_argument("--risk-measure", choices=RISK_MEASURES, default=RISK_MEASURE)
+    run_parser.add_argument("--cvar-alpha", type=float, default=CVAR_ALPHA)
+    run_parser.add_argument("--scenario-seed", type=int, default=SCENARIO_SEED)
+
+    evaluate_parser = commands.add_parser("evaluate", help="print f_w and f_c of the solutions in a csv file")
+    evaluate_parser.add_argument("solutions")
+    evaluate_parser.add_argument("--scenarios", type=int, default=0,
+                                 help="print the expected value and CVaR of f_w and f_c over this many scenarios")
+    evaluate_parser.add_argument("--cvar-alpha", type=float, default=CVAR_ALPHA)
+    evaluate_parser.add_argument("--scenario-seed", type=int, default=SCENARIO_SEED)
+
+    depletion_parser = commands.add_parser("depletion", help="print the years until the aquifer is depleted for the "
+                                                             "solutions in a csv file")
+    depletion_parser.add_argument("solutions", nargs="?", default=SOLUTION_FILE)
 
-algorithm = NSGA2(  # initialize an instance of the NSGA-II algorithm
-    pop_size=POPULATION_SIZE,
-    sampling=get_sampling("int_random"),  # we use integer sampling so we get random integers
-    crossover=get_crossover("int_sbx", prob=1.0, eta=3.0),  # special crossover for integer variables
-    mutation=get_mutation("int_pm", eta=3.0),  # special mutation for integer variables
-    eliminate_duplicates=True,  # we do not want duplicate solutions
-)
+    exact_parser = commands.add_parser("exact", help="compute the exact Pareto front of a small region")
+    exact_parser.add_argument("--output", default=EXACT_SOLUTION_FILE)
+    exact_parser.add_argument("--heuristic", help="a csv file of solutions to compare with the exact front")
 
-problem = TechniqueProblem()  # create an instance of our problem class
+    animate_parser = commands.add_parser("animate", help="render the generations of a recorded run (or the solutions "
+                                                         "in a csv file) to an animation")
+    animate_parser.add_argument("--run-directory", default=RUN_DIRECTORY)
+    animate_parser.add_argument("--solutions", help="animate the solutions in this csv file instead of a run")
+    animate_parser.add_argument("--output", default=ANIMATION_FILE, help="a .gif or .mp4 file")
+    animate_parser.add_argument("--kind", choices=["graph", "choropleth"], default="graph")
+    animate_parser.add_argument("--every", type=int, default=1, help="render every n-th generation")
+    animate_parser.add_argument("--frames", default=FRAME_DIRECTORY, help="directory the png frames are written to")
+    animate_parser.add_argument("--processes", type=int, default=RENDER_PROCESSES)
 
-result = minimize(  # run the minimize function using our algorithm and problem object
-    problem,
-    algorithm,
-    termination=('n_gen', GENERATIONS),  # set to terminate after n_gen = GENERATIONS
-    seed=1,  # seed for random numbering, can be altered as desired
-    save_history=True  # save history for analysis after the algorithm has finished
-)
+    plot_parser = commands.add_parser("plot", help="plot one of the solutions in a csv file")
+    plot_parser.add_argument("solutions", nargs="?", default=SOLUTION_FILE)
+    plot_parser.add_argument("--row", type=int, default=0, help="the row of the solution to plot")
+    plot_parser.add_argument("--kind", choices=["graph", "choropleth"], default="graph")
 
-last_gen = result.history[-1]  # return the snapshot from the final generation of the algorithm by indexing the end of
-                               # the result's history
-# acquire and sort our solutions based on f_c
-sol_pop = [np.concatenate([individual.F, individual.X]) for individual in last_gen.pop]
-sol_pop = np.stack(sol_pop, axis=0)
-sol_pop = sol_pop[np.argsort(sol_pop[:, 1])]
+    arguments = parser.parse_args(argv)
+    if arguments.command is None:  # running this file without a command runs the optimization, as it always has
+        arguments = parser.parse_args(["--data", arguments.data, "run"])
+    dataset = Dataset(arguments.data)
 
+    if arguments.command == "run":
+        statistics = dict()
+        final_X, final_F = run(dataset, arguments.population_size, arguments.generations, arguments.seeds,
+                               batched_evaluation=not arguments.elementwise,
+                               evaluation_processes=arguments.evaluation_processes,
+                               run_processes=arguments.run_processes, islands=arguments.islands,
+                               migration_interval=arguments.migration_interval,
+                               migration_size=arguments.migration_size,
+                               migration_topology=arguments.migration_topology,
+                               evaluation_cache_file=arguments.evaluation_cache_file,
+                               run_directory=arguments.run_directory or None,
+                               checkpoint_every=arguments.checkpoint_every,
+                               resume=arguments.resume, refine_final_population=arguments.refine,
+                               memetic_local_search=arguments.memetic, profile_directory=arguments.profile,
+                               robust_scenarios=arguments.scenarios, risk_measure=arguments.risk_measure,
+                               cvar_alpha=arguments.cvar_alpha, scenario_seed=arguments.scenario_seed,
+                               statistics=statistics)
+        save_solution(final_X, final_F, arguments.output)
+        if "evaluation_cache" in statistics:
+            print("evaluation cache:", statistics["evaluation_cache"])
+        if "profile" in statistics:
+            print(statistics["profile"])
+    elif arguments.command == "evaluate":
+        X = load_solution(arguments.solutions, dataset.NUMBER_COUNTIES)
+        if arguments.scenarios > 0:
+            F = evaluate_robust(dataset, X, arguments.scenarios, arguments.cvar_alpha, arguments.scenario_seed)
+        else:
+            F = evaluate(dataset, X)
+        np.savetxt(sys.stdout, F, delimiter=",")
+    elif arguments.command == "depletion":  # f_w, f_c, the usage level in % of 2021 and the years until depletion
+        F = evaluate(dataset, load_solution(arguments.solutions, dataset.NUMBER_COUNTIES))
+        np.savetxt(sys.stdout, np.column_stack([F, usage_percent(F[:, 0]), depletion_horizons(F)]), delimiter=",")
+    elif arguments.command == "exact":
+        heuristic_X = load_solution(arguments.heuristic, dataset.NUMBER_COUNTIES) if arguments.heuristic else None
+        X, F, statistics, distance = solve_exact(dataset, heuristic_X)
+        save_solution(X, F, arguments.output)
+        print("exact front:", statistics)
+        if distance is not None:
+            print("distance of the heuristic front:", distance)
+    elif arguments.command == "animate":
+        print("saved", animate_run(dataset, arguments.run_directory, arguments.solutions, arguments.output,
+                                   arguments.kind, arguments.every, arguments.frames, arguments.processes))
+    elif arguments.command == "plot":
+        plot(dataset, load_solution(arguments.solutions, dataset.NUMBER_COUNTIES)[arguments.row], arguments.kind)
 
-np.savetxt("solution.csv", sol_pop, delimiter=",")
 
+if __name__ == "__main__":
+    main()
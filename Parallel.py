@@ -0,0 +1,193 @@
+import numpy as np
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+from pymoo.core.problem import Problem
+from pymoo.algorithms.moo.nsga2 import NSGA2
+from pymoo.factory import get_sampling, get_crossover, get_mutation
+from pymoo.optimize import minimize
+from pymoo.util.nds.non_dominated_sorting import NonDominatedSorting
+
+from CountyMap import count_components_batch
+from IrrigationTechniques import technique_tables
+from Objectives import water_usage_batch, technique_cost_batch
+
+# the classes and functions in this file evaluate populations and run whole optimizations in several processes at once;
+# the county data never changes during a run, so it is placed in shared memory once and every worker process reads it
+# from there instead of receiving a pickled copy with every task
+
+_WORKER_ARRAYS = None  # the shared county data, as seen from inside a worker process
+_WORKER_BLOCKS = None  # the shared memory blocks backing _WORKER_ARRAYS, which have to stay open while they are used
+
+
+def nsga2_algorithm(population_size):  # the NSGA-II configuration used for all of our optimizations
+    return NSGA2(
+        pop_size=population_size,
+        sampling=get_sampling("int_random"),  # we use integer sampling so we get random integers
+        crossover=get_crossover("int_sbx", prob=1.0, eta=3.0),  # special crossover for integer variables
+        mutation=get_mutation("int_pm", eta=3.0),  # special mutation for integer variables
+        eliminate_duplicates=True,  # we do not want duplicate solutions
+    )
+
+
+def problem_arrays(county_map, crop_table, county_gradients):
+    # the county data needed to evaluate solutions, as a dictionary of numpy arrays that can be shared between processes
+    efficiency_table, cost_table = technique_tables(county_gradients)  # (n_counties x n_techniques) arrays
+    return {"county_water": crop_table.county_water(),
+            "county_acreage": crop_table.county_acreage(),
+            "efficiency_table": efficiency_table,
+            "cost_table": cost_table,
+            "edge_sources": county_map.EDGE_SOURCES,
+            "edge_targets": county_map.EDGE_TARGETS}
+
+
+def evaluate_population(arrays, population_techniques):  # both objectives for a (pop_size x n_counties) population
+    return ArrayProblem(arrays).objectives(population_techniques)
+
+
+def non_dominated_mask(F):
+    # which of the points F are not dominated by any other point; for our two objectives this sorts by f_w (then f_c)
+    # and keeps a point when its f_c is the lowest of its f_w and below every f_c of a lower f_w, which takes
+    # O(n log n) instead of the O(n^2) of NonDominatedSorting (still used for more objectives)
+    F = np.asarray(F, dtype=float)
+    mask = np.zeros(len(F), dtype=bool)
+    if len(F) == 0:
+        return mask
+    if F.shape[1] != 2:
+        mask[NonDominatedSorting().do(F, only_non_dominated_front=True)] = True
+        return mask
+    order = np.lexsort((F[:, 1], F[:, 0]))
+    f_w, f_c = F[order, 0], F[order, 1]
+    group_start = np.searchsorted(f_w, f_w, side="left")  # the first point with the same f_w
+    best_before = np.concatenate([[np.inf], np.minimum.accumulate(f_c)])[group_start]  # lowest f_c of a lower f_w
+    mask[order] = (f_c == f_c[group_start]) & (f_c < best_before)
+    return mask
+
+
+def non_dominated_front(X, F):  # the unique non-dominated solutions among X with objective values F
+    front = non_dominated_mask(F)  # copies of a solution have the same objectives, so they do not dominate each other
+    # and only the front has to be searched for copies
+    X, F = np.ascontiguousarray(np.asarray(X)[front]), np.asarray(F)[front]
+    rows = X.view(np.dtype((np.void, X.dtype.itemsize * X.shape[1]))).ravel()  # every row as a single value, which
+    # np.unique compares much faster than rows with axis=0
+    _, unique_rows = np.unique(rows, return_index=True)
+    return X[unique_rows], F[unique_rows]
+
+
+class SharedArrays:
+    # copies a dictionary of numpy arrays into shared memory blocks; descriptors holds what a worker process needs to
+    # attach to them, and the blocks are removed again by close()
+    def __init__(self, arrays):
+        self.blocks = []
+        self.descriptors = dict()
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self.blocks.append(block)
+            self.descriptors[name] = (block.name, array.shape, array.dtype.str)
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def attach_shared_arrays(descriptors):  # the arrays described by SharedArrays.descriptors, read from shared memory
+    blocks, arrays = [], dict()
+    for name, (block_name, shape, dtype) in descriptors.items():
+        block = SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return arrays, blocks
+
+
+def _attach_worker(descriptors):  # runs once when a worker process starts
+    global _WORKER_ARRAYS, _WORKER_BLOCKS
+    _WORKER_ARRAYS, _WORKER_BLOCKS = attach_shared_arrays(descriptors)
+
+
+def _evaluate_in_worker(population_techniques):
+    return evaluate_population(_WORKER_ARRAYS, population_techniques)
+
+
+def _run_in_worker(configuration):
+    result = minimize(ArrayProblem(_WORKER_ARRAYS),
+                      nsga2_algorithm(configuration["population_size"]),
+                      termination=('n_gen', configuration["generations"]),
+                      seed=configuration["seed"])
+    return result.pop.get("X").astype(int), result.pop.get("F")
+
+
+class ArrayProblem(Problem):
+    # the batched irrigation technique problem: pymoo hands us the whole population as a (pop_size x n_counties) matrix
+    # and the objectives are computed with array operations over the per-county data of problem_arrays; as it only
+    # needs those arrays, it can also be created inside worker processes (see ParallelProblem and run_many)
+    def __init__(self, arrays):
+        super().__init__(
+            n_var=len(arrays["county_water"]),
+            n_obj=2,
+            n_constr=0,
+            xl=0,
+            xu=arrays["efficiency_table"].shape[1] - 1,
+            type_var=int
+        )
+        self.arrays = arrays
+
+    def _evaluate(self, x, out, *args, **kwargs):
+        out["F"] = self.objectives(x)
+
+    def objectives(self, x):  # f_w and f_c of every solution, as a (pop_size x 2) array
+        x = np.asarray(x, dtype=int)
+        num_components = np.sum(self.components(x), axis=1)  # count the connected blocks of irrigation techniques for
+        # every solution at once
+        return np.column_stack([self.water_usage(x), self.technique_cost(x, num_components)])
+
+    PHASES = ["components", "water_usage", "technique_cost"]
+
+    def components(self, x):
+        return count_components_batch(self.arrays["edge_sources"], self.arrays["edge_targets"], x,
+                                      self.arrays["efficiency_table"].shape[1])
+
+    def water_usage(self, x):
+        return water_usage_batch(self.arrays["county_water"], self.arrays["efficiency_table"], x)
+
+    def technique_cost(self, x, num_components):
+        return technique_cost_batch(self.arrays["county_acreage"], self.arrays["cost_table"], x, num_components)
+
+
+class ParallelProblem(ArrayProblem):
+    # evaluates every population by splitting it into one chunk per process of a process pool; call close() once the
+    # optimization has finished to stop the processes and free the shared memory
+    def __init__(self, arrays, processes):
+        super().__init__(arrays)
+        self.processes = processes
+        self.shared = SharedArrays(arrays)
+        self.pool = Pool(processes, initializer=_attach_worker, initargs=(self.shared.descriptors,))
+        self.exclude_from_serialization = self.exclude_from_serialization + ["shared", "pool"]
+
+    def _evaluate(self, x, out, *args, **kwargs):
+        chunks = [chunk for chunk in np.array_split(np.asarray(x), self.processes) if len(chunk) > 0]
+        out["F"] = np.concatenate(self.pool.map(_evaluate_in_worker, chunks), axis=0)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.shared.close()
+
+
+def run_many(arrays, configurations, processes=None):
+    # runs one optimization per configuration (a dictionary with a seed, population_size and generations) in a process
+    # pool and returns the final population of every run together with the non-dominated front of all runs combined
+    with SharedArrays(arrays) as shared:
+        with Pool(processes, initializer=_attach_worker, initargs=(shared.descriptors,)) as pool:
+            runs = pool.map(_run_in_worker, configurations, chunksize=1)
+
+    front = non_dominated_front(np.concatenate([X for X, F in runs]), np.concatenate([F for X, F in runs]))
+    return runs, front
@@ -0,0 +1,153 @@
+import os
+import time
+import numpy as np
+from pymoo.core.callback import Callback
+
+# the classes in this file measure where the time of a run goes; a Profiler records the wall time and number of calls of
+# every phase (evaluating the objectives, counting components, crossover, survival, ...) by replacing methods of the
+# problem and algorithm objects with timed versions, so nothing is measured and nothing is slowed down unless a run is
+# profiled; ProfilingCallback adds a trace of every generation
+
+SUMMARY_FILE = "profile_summary.txt"  # table of the time spent in every phase
+TRACE_FILE = "profile_trace.csv"  # one row per generation
+ALGORITHM_PHASES = [("mating", "mating"),  # the phases of the NSGA-II loop, as (attribute of the algorithm, phase)
+                    ("mating.selection", "selection"),
+                    ("mating.crossover", "crossover"),
+                    ("mating.mutation", "mutation"),
+                    ("survival", "survival")]
+
+
+class TimedMethod:
+    # a method that adds its wall time to a phase of a profiler whenever it is called; with count_sizes, the lengths of
+    # the first argument and of the result are added to the counters "<phase> in" and "<phase> out", which is how the
+    # number of duplicates removed is counted
+    def __init__(self, profiler, phase, method, count_sizes=False):
+        self.profiler = profiler
+        self.phase = phase
+        self.method = method
+        self.count_sizes = count_sizes
+
+    def __call__(self, *args, **kwargs):
+        start_time = time.perf_counter()
+        result = self.method(*args, **kwargs)
+        self.profiler.add_time(self.phase, time.perf_counter() - start_time)
+        if self.count_sizes:
+            self.profiler.add_count(self.phase + " in", len(args[0]))
+            self.profiler.add_count(self.phase + " out", len(result))
+        return result
+
+    def __reduce__(self):  # copies and checkpoints of an object keep the original method, not the timed one
+        return getattr, (self.method.__self__, self.method.__name__)
+
+
+class Profiler:
+    def __init__(self):
+        self.seconds = dict()  # cumulative wall time of every phase
+        self.calls = dict()  # number of calls of every phase
+        self.counts = dict()  # other counters, such as the number of evaluations
+        self.start_time = time.perf_counter()
+
+    def add_time(self, phase, seconds):
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+
+    def add_count(self, counter, number):
+        self.counts[counter] = self.counts.get(counter, 0) + number
+
+    def instrument(self, owner, method_name, phase, count_sizes=False):
+        # replaces owner.method_name with a timed version that records into phase; owners that are already instrumented
+        # are left alone
+        method = getattr(owner, method_name)
+        if not isinstance(method, TimedMethod):
+            setattr(owner, method_name, TimedMethod(self, phase, method, count_sizes))
+
+    def instrument_problem(self, problem, phase="problem"):
+        # times every evaluation of problem, and the phases of the problems it wraps (the cache of CachedProblem) or of
+        # the objectives it computes (see TechniqueProblem.PHASES)
+        self.instrument(problem, "_evaluate", phase)
+        for method_name in getattr(problem, "PHASES", []):
+            self.instrument(problem, method_name, "%s.%s" % (phase, method_name))
+        if hasattr(problem, "problem"):
+            self.instrument_problem(problem.problem, phase + ".uncached")
+
+    def instrument_algorithm(self, algorithm):  # times the phases of the NSGA-II loop
+        for attribute, phase in ALGORITHM_PHASES:
+            owner = algorithm
+            for name in attribute.split("."):
+                owner = getattr(owner, name)
+            self.instrument(owner, "do", phase)
+        self.instrument(algorithm.eliminate_duplicates, "do", "eliminate_duplicates", count_sizes=True)
+        self.instrument(algorithm.evaluator, "eval", "evaluator")
+
+    def duplicate_rate(self):  # the fraction of generated solutions that were removed as duplicates
+        generated = self.counts.get("eliminate_duplicates in", 0)
+        return 1 - self.counts.get("eliminate_duplicates out", 0) / generated if generated > 0 else 0.0
+
+    def summary(self):  # a table of the phases, sorted by the time spent in them
+        total_seconds = time.perf_counter() - self.start_time
+        lines = ["%-32s %10s %12s %12s %8s" % ("phase", "calls", "seconds", "ms/call", "% run")]
+        for phase in sorted(self.seconds, key=self.seconds.get, reverse=True):
+            lines.append("%-32s %10d %12.4f %12.4f %8.2f" % (phase, self.calls[phase], self.seconds[phase],
+                                                              1000 * self.seconds[phase] / self.calls[phase],
+                                                              100 * self.seconds[phase] / total_seconds))
+        lines.append("")
+        lines.append("%-32s %12.4f" % ("run seconds", total_seconds))
+        for counter in sorted(self.counts):
+            lines.append("%-32s %12d" % (counter, self.counts[counter]))
+        lines.append("%-32s %12.4f" % ("duplicate rate", self.duplicate_rate()))
+        return "\n".join(lines)
+
+
+class ProfilingCallback(Callback):
+    # records a trace row for every generation (evaluations, wall time, cache and duplicate rates and the time spent in
+    # every phase during the generation); call attach once the algorithm is set up (or resumed from a checkpoint) and
+    # before its first generation, so the phases of that generation are timed too; cache is the EvaluationCache of the
+    # run, if there is one
+    def __init__(self, profiler, cache=None):
+        super().__init__()
+        self.profiler = profiler
+        self.cache = cache
+        self.rows = []
+        self.last = None
+
+    def attach(self, algorithm):
+        # instruments the phases of the algorithm and starts the trace from its current state, so the first row of a
+        # resumed run only counts the evaluations made after the checkpoint
+        self.profiler.instrument_algorithm(algorithm)
+        self.last = self.snapshot(algorithm)
+
+    def snapshot(self, algorithm):  # the counters that the rows of the trace are the differences of
+        return {"time": time.perf_counter(), "n_eval": algorithm.evaluator.n_eval,
+                "seconds": dict(self.profiler.seconds), "counts": dict(self.profiler.counts),
+                "cache": self.cache.statistics() if self.cache is not None else {"hits": 0, "misses": 0}}
+
+    def notify(self, algorithm, **kwargs):
+        current = self.snapshot(algorithm)
+        last = self.last if self.last is not None else {"time": self.profiler.start_time, "n_eval": 0, "seconds": {},
+                                                        "counts": {}, "cache": {"hits": 0, "misses": 0}}
+        lookups = current["cache"]["hits"] + current["cache"]["misses"] - last["cache"]["hits"] - \
+            last["cache"]["misses"]
+        generated = current["counts"].get("eliminate_duplicates in", 0) - last["counts"].get("eliminate_duplicates in",
+                                                                                              0)
+        removed = generated - current["counts"].get("eliminate_duplicates out", 0) + \
+            last["counts"].get("eliminate_duplicates out", 0)
+
+        row = {"n_gen": algorithm.n_gen, "n_eval": algorithm.evaluator.n_eval,
+               "evaluations": current["n_eval"] - last["n_eval"], "seconds": current["time"] - last["time"],
+               "cache_hit_rate": (current["cache"]["hits"] - last["cache"]["hits"]) / lookups if lookups > 0 else 0.0,
+               "duplicate_rate": removed / generated if generated > 0 else 0.0}
+        for phase, seconds in current["seconds"].items():
+            row[phase] = seconds - last["seconds"].get(phase, 0.0)
+        self.rows.append(row)
+        self.last = current
+
+    def save(self, directory):  # write the summary table and the trace of every generation to directory
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, SUMMARY_FILE), "w") as summary_file:
+            summary_file.write(self.profiler.summary() + "\n")
+        if self.rows:
+            columns = list(self.rows[0].keys())
+            columns += sorted({column for row in self.rows for column in row} - set(columns))  # phases seen later
+            table = np.array([[row.get(column, 0.0) for column in columns] for row in self.rows], dtype=float)
+            np.savetxt(os.path.join(directory, TRACE_FILE), table, delimiter=",", header=",".join(columns),
+                       comments="", fmt="%.10g")
@@ -0,0 +1,110 @@
+import numpy as np
+
+# numpy versions of the aquifer depletion (matlab/waterdepletion.m) and income (matlab/income.m) models, with the same
+# formulas; instead of stepping through every year for every usage level, the volume of the aquifer is written in terms
+# of cumulative sums over the years, which gives the years until depletion of any number of usage levels at once, so
+# the f_w of every solution found by the optimizer can be mapped to a depletion horizon
+
+INITIAL_VOLUME = 129430000000000  # volume of the aquifer in START_YEAR
+START_YEAR = 2013
+END_YEAR = 5000  # the last year simulated; usage levels that do not deplete the aquifer by then get nan
+REFERENCE_YEAR = 2022  # years until depletion are counted from this year
+WATER_USAGE_2021 = 4776985806438  # water used in 2021, which is 100% usage; f_w is compared against this
+DEMAND_2021 = 25575739705
+REPLENISH_2005 = 4691658250306
+
+MEAN_LOG_INCOME = np.log(53383.18)
+SD_LOG_INCOME = np.sqrt(2 * np.log(53383.18 / 34612.04))
+INCOME_THRESHOLD_2022 = 21252
+INCOME_MULTIPLIERS = {2022: 1, 2050: 1.890421175, 2100: 2.406898457}  # growth of the income threshold by year
+INCOME_SAMPLES = 10000
+
+
+def population(years):  # the population of the US in each year
+    return 669310000 / (1 + 6.41637 * np.exp(-0.0168833 * (years - 1910)))
+
+
+def demand(years):
+    return 2 / 3 * 1996 * 0.057 * population(years)
+
+
+def water_usage(years, usage_percent):  # the water used in each year with usage_percent % of the 2021 usage level
+    return usage_percent / 100 * WATER_USAGE_2021 * demand(years) / DEMAND_2021
+
+
+def temperature(years):  # the average temperature in each year
+    return 287.37 + 0.008 * (years - 2005)
+
+
+def replenish(years):  # the replenishment of the aquifer in each year
+    return REPLENISH_2005 * np.exp(1 / (temperature(2005) - 1 / temperature(years)))
+
+
+def depletion_thresholds(start_year=START_YEAR, end_year=END_YEAR, initial_volume=INITIAL_VOLUME):
+    # the volume after year y is initial_volume + R_y - p / 100 * U_y, where R_y and U_y are the replenishment and the
+    # water used at 100% usage, summed up to year y; it is negative exactly when p / 100 > (initial_volume + R_y) / U_y,
+    # so a usage level depletes the aquifer in the first year whose threshold it exceeds; returns the years and the
+    # running minimum of the thresholds, which is non-increasing
+    years = np.arange(start_year, end_year + 1)
+    thresholds = (initial_volume + np.cumsum(replenish(years))) / np.cumsum(water_usage(years, 100))
+    return years, np.minimum.accumulate(thresholds)
+
+
+def years_to_depletion(usage_percent, start_year=START_YEAR, end_year=END_YEAR, initial_volume=INITIAL_VOLUME,
+                       reference_year=REFERENCE_YEAR):
+    # the years from reference_year until the aquifer is depleted, for an array of usage levels in % of the 2021 usage;
+    # like waterdepletion.m, this is the first year in which the volume drops below zero, and usage levels that never
+    # deplete the aquifer by end_year get nan
+    usage_fraction = np.asarray(usage_percent, dtype=float) / 100
+    years, thresholds = depletion_thresholds(start_year, end_year, initial_volume)
+    first_year = np.searchsorted(-thresholds, -usage_fraction, side="right")  # the first year with threshold < usage
+    depleted = first_year < len(years)
+    return np.where(depleted, years[np.minimum(first_year, len(years) - 1)] - reference_year, np.nan)
+
+
+def depletion_curve(usage_percents=np.arange(1, 101), **kwargs):  # years until depletion for a grid of usage levels,
+    # as plotted by waterdepletion.m
+    return usage_percents, years_to_depletion(usage_percents, **kwargs)
+
+
+def usage_percent(f_w, water_usage_2021=WATER_USAGE_2021):  # the usage level of solutions with the given f_w, in %
+    return 100 * np.asarray(f_w, dtype=float) / water_usage_2021
+
+
+def depletion_horizons(F, water_usage_2021=WATER_USAGE_2021, **kwargs):
+    # the years until depletion of every solution of a (n_solutions x 2) array of objective values (f_w, f_c), e.g. a
+    # Pareto front found by the optimizer, taking f_w as the yearly water usage in the units of water_usage_2021
+    return years_to_depletion(usage_percent(np.asarray(F)[:, 0], water_usage_2021), **kwargs)
+
+
+def simulate_incomes(number_samples=INCOME_SAMPLES, rng=None):  # the log incomes of number_samples income earners
+    rng = np.random.default_rng() if rng is None else rng
+    return rng.normal(MEAN_LOG_INCOME, SD_LOG_INCOME, number_samples)
+
+
+def income_threshold_fractions(log_incomes, multipliers=INCOME_MULTIPLIERS, threshold=INCOME_THRESHOLD_2022):
+    # the fraction of the simulated earners whose income is at most the income threshold of every year, as in income.m
+    log_thresholds = np.log(threshold * np.array(list(multipliers.values()), dtype=float))
+    fractions = np.mean(np.asarray(log_incomes)[:, np.newaxis] <= log_thresholds, axis=0)
+    return dict(zip(multipliers.keys(), fractions))
+
+
+def plot_depletion_curve(usage_percents=np.arange(1, 101)):  # the plot of waterdepletion.m
+    import matplotlib.pyplot as plt
+    usage_percents, years = depletion_curve(usage_percents)
+    plt.plot(usage_percents, years)
+    plt.xlabel("Percent Demand Usage of Water")
+    plt.ylabel("Years until Depletion")
+    plt.title("Distribution of Years Until Depletion of Aquifer by Percent Water Use")
+    plt.show()
+
+
+def plot_incomes(log_incomes, multipliers=INCOME_MULTIPLIERS, threshold=INCOME_THRESHOLD_2022):  # the plot of income.m
+    import matplotlib.pyplot as plt
+    plt.hist(log_incomes, 100)
+    for color, multiplier in zip(["r", "g", "m"], multipliers.values()):
+        plt.axvline(np.log(threshold * multiplier), color=color, linewidth=2.0)
+    plt.xlabel("ln(Income)")
+    plt.ylabel("Frequency")
+    plt.title("Simulated %d Income Earners" % len(log_incomes))
+    plt.show()
@@ -0,0 +1,246 @@
+import os
+import numpy as np
+from multiprocessing import Pool
+
+from DataCache import atomic_write
+from RunHistory import read_history, read_populations, HISTORY_FILE, POPULATION_FILE, ARCHIVE_FILE
+
+# the classes and functions in this file render solutions to png frames and assemble the frames into animations, such as
+# the evolution of the population and front over the generations of a run; the county positions, edges, labels and
+# outlines are gathered once into a MapRenderer (the outlines are also cached on disk), so a frame only has to color the
+# counties, and frames are rendered in a process pool; matplotlib, geopandas and imageio are only imported when they are
+# used
+
+FRAME_DIRECTORY = "./frames"  # the png frames are written to this directory as frame_00000.png, frame_00001.png, ...
+ANIMATION_FILE = "front_evolution.gif"  # the animation is saved as a gif, or as an mp4 if the file name ends in .mp4
+# (which needs the ffmpeg plugin of imageio)
+FRAMES_PER_SECOND = 5
+FRAME_DPI = 100
+MAP_SIZE = (10, 10)  # the size of a frame holding only a map, in inches
+FRAME_SIZE = (20, 10)  # the size of a frame holding a map and the objective values of the population, in inches
+RENDER_PROCESSES = None  # the number of processes frames are rendered with; None uses every core and 1 renders in this
+# process
+MAP_KINDS = ["graph", "choropleth"]
+GEOMETRY_CACHE_FILE = "county_geometry.npz"  # the county outlines used by choropleth frames are cached here
+COUNTY_SHAPEFILE = "gz_2010_us_050_00_500k.shp"  # the county shapes bundled with plotly-geo, which are also the ones
+# used by create_choropleth in CountyMap.county_choropleth_by_technique
+BACKGROUND_COLOR = "#e5e5e5"
+
+_WORKER_RENDERER = None  # the renderer of a worker process, which is sent to every worker once
+
+
+def load_county_polygons(fips, cache_file=GEOMETRY_CACHE_FILE):
+    # the outlines of the counties with the given FIPS codes, as a list holding a list of (n_points x 2) arrays of
+    # longitudes and latitudes for every county; reading the shapefile takes much longer than rendering a frame, so the
+    # outlines are cached in cache_file and the shapefile is only read when the cache is missing or holds other counties
+    fips = np.asarray(fips, dtype=np.int64)
+    if cache_file is not None and os.path.exists(cache_file):
+        try:
+            with np.load(cache_file) as cache:
+                if np.array_equal(cache["fips"], fips):
+                    return _split_outlines(cache["points"], cache["ring_ends"], cache["ring_counties"], len(fips))
+        except (OSError, KeyError, ValueError):  # a damaged cache is ignored and rebuilt
+            pass
+
+    import geopandas
+    import _plotly_geo
+    shapes = geopandas.read_file(os.path.join(os.path.dirname(os.path.realpath(_plotly_geo.__file__)), "package_data",
+                                              COUNTY_SHAPEFILE))
+    geometries = dict(zip((shapes["STATE"] + shapes["COUNTY"]).astype(int).tolist(), shapes["geometry"]))
+    rings, ring_counties = [], []
+    for county, code in enumerate(fips.tolist()):
+        if code not in geometries:
+            raise ValueError("County FIPS %d is not present in the county shapes." % code)
+        for polygon in getattr(geometries[code], "geoms", [geometries[code]]):  # a county can have several polygons
+            rings.append(np.asarray(polygon.exterior.coords, dtype=float)[:, :2])
+            ring_counties.append(county)
+    points = np.concatenate(rings) if rings else np.zeros((0, 2))
+    ring_ends = np.cumsum([len(ring) for ring in rings], dtype=np.int64)
+
+    if cache_file is not None:
+        try:
+            with atomic_write(cache_file) as cache:
+                np.savez(cache, fips=fips, points=points, ring_ends=ring_ends,
+                         ring_counties=np.asarray(ring_counties, dtype=np.int64))
+        except OSError:  # the cache is only an optimization
+            pass
+    return _split_outlines(points, ring_ends, ring_counties, len(fips))
+
+
+def _split_outlines(points, ring_ends, ring_counties, number_counties):
+    outlines = [[] for _ in range(0, number_counties)]
+    for ring, county in zip(np.split(points, ring_ends[:-1]), np.asarray(ring_counties).tolist()):
+        outlines[county].append(ring)
+    return outlines
+
+
+class MapRenderer:
+    # renders solutions of county_map as a graph of the counties colored by technique ("graph", in which edges join
+    # neighbouring counties using the same technique) or as a choropleth map ("choropleth"); outlines can be passed in
+    # as returned by load_county_polygons, and are otherwise loaded for the FIPS codes of the counties
+    def __init__(self, county_map, kind="graph", labels=False, outlines=None):
+        if kind not in MAP_KINDS:
+            raise ValueError("Plot kind is not present in list.")
+        number_counties = len(county_map.COUNTY_LIST)
+        self.kind = kind
+        self.positions = np.array([county_map.COUNTY_LOCATIONS[county] for county in range(0, number_counties)],
+                                  dtype=float).reshape(number_counties, 2)
+        self.edge_sources, self.edge_targets = county_map.EDGE_SOURCES, county_map.EDGE_TARGETS
+        self.labels = [name for name, county in sorted(county_map.COUNTY_LIST.items(), key=lambda item: item[1])] \
+            if labels else None
+        self.technique_names = [county_map.TECHNIQUES[technique] for technique in sorted(county_map.TECHNIQUES)]
+        self.technique_colors = np.array([county_map.NODE_COLORS_BY_TECHNIQUE[technique]
+                                          for technique in sorted(county_map.TECHNIQUES)], dtype=object)
+        self.rings, self.ring_counties = None, None
+        if kind == "choropleth":
+            if outlines is None:
+                outlines = load_county_polygons([county_map.COUNTY_FIPS[county]
+                                                 for county in range(0, number_counties)])
+            self.rings = [ring for county_rings in outlines for ring in county_rings]
+            self.ring_counties = np.array([county for county, county_rings in enumerate(outlines)
+                                           for _ in county_rings], dtype=int)
+
+    def render(self, path, techniques=None, F=None, highlight=None, front=None, limits=None, title=None):
+        # renders a frame to the png file path; the frame holds the map of a solution (techniques) and/or a plot of the
+        # objective values F of a population, in which the solution with index highlight is marked and front (e.g. the
+        # final front of the run) is drawn for reference; limits fixes the axes of that plot, so frames can be compared
+        from matplotlib.figure import Figure  # figures are created without pyplot, so no window or backend is needed
+        panels = (techniques is not None) + (F is not None)
+        figure = Figure(figsize=FRAME_SIZE if panels == 2 else MAP_SIZE)
+        axes = figure.subplots(1, panels, squeeze=False)[0] if panels > 0 else []
+        if techniques is not None:
+            self.draw_map(axes[0], np.asarray(techniques, dtype=int))
+        if F is not None:
+            self.draw_objectives(axes[-1], np.asarray(F), highlight, front, limits)
+        if title is not None:
+            figure.suptitle(title, fontsize=16)
+        figure.savefig(path, dpi=FRAME_DPI, facecolor=BACKGROUND_COLOR)
+        return path
+
+    def draw_map(self, axis, techniques):
+        from matplotlib.collections import LineCollection, PolyCollection
+        from matplotlib.lines import Line2D
+        colors = self.technique_colors[techniques]
+        if self.kind == "graph":
+            same_technique = techniques[self.edge_sources] == techniques[self.edge_targets]
+            sources, targets = self.edge_sources[same_technique], self.edge_targets[same_technique]
+            axis.add_collection(LineCollection(np.stack([self.positions[sources], self.positions[targets]], axis=1),
+                                               colors=colors[sources].tolist(), linewidths=1.5, zorder=1))
+            axis.scatter(self.positions[:, 0], self.positions[:, 1], s=150, c=colors.tolist(), zorder=2)
+            if self.labels is not None:
+                for (x, y), label in zip(self.positions.tolist(), self.labels):
+                    axis.text(x + 0.4, y + 0.25, label, fontsize=11)
+            axis.margins(x=0.2)
+        else:
+            axis.add_collection(PolyCollection(self.rings, facecolors=colors[self.ring_counties].tolist(),
+                                               edgecolors="white", linewidths=0.5))
+            axis.autoscale_view()
+        axis.set_aspect("equal")
+        axis.set_axis_off()
+        axis.legend(handles=[Line2D([], [], marker="o", linestyle="", color=color, label=name)
+                             for name, color in zip(self.technique_names, self.technique_colors.tolist())],
+                    title="Irrigation Technique by County", loc="lower left")
+
+    def draw_objectives(self, axis, F, highlight=None, front=None, limits=None):
+        if front is not None:
+            front = np.asarray(front)
+            front = front[np.argsort(front[:, 0])]
+            axis.plot(front[:, 0], front[:, 1], color="grey", linewidth=1, zorder=1, label="final front")
+        axis.scatter(F[:, 0], F[:, 1], s=20, color="tab:blue", zorder=2, label="population")
+        if highlight is not None:
+            axis.scatter(F[highlight, 0], F[highlight, 1], s=200, marker="*", color="red", zorder=3,
+                         label="solution shown")
+        if limits is not None:
+            axis.set_xlim(limits[0][0], limits[1][0])
+            axis.set_ylim(limits[0][1], limits[1][1])
+        axis.set_xlabel("f_w (gallons)")
+        axis.set_ylabel("f_c (dollars)")
+        axis.legend(loc="upper right")
+
+
+def objective_limits(*arrays, margin=0.05):  # the axis limits (lower, upper) that show every point of the arrays of F
+    F = np.concatenate([np.asarray(array).reshape(-1, 2) for array in arrays])
+    lower, upper = np.min(F, axis=0), np.max(F, axis=0)
+    padding = margin * np.maximum(upper - lower, np.abs(upper) * 1e-9 + 1e-12)
+    return lower - padding, upper + padding
+
+
+def representative_solution(F, limits):
+    # the index of the solution closest to the ideal point, with both objectives scaled to limits; this is always a
+    # non-dominated solution and picks a balanced solution to show for a generation
+    lower, upper = limits
+    return int(np.argmin(np.sum((np.asarray(F) - lower) / (upper - lower), axis=1)))
+
+
+def solution_frames(X, F):
+    # one frame for every solution, from the cheapest to the most expensive, each marked on the objective values of all
+    # of the solutions
+    X, F = np.asarray(X, dtype=int), np.asarray(F)
+    limits = objective_limits(F)
+    return [{"techniques": X[index], "F": F, "highlight": int(index), "limits": limits,
+             "title": "f_w = %.4g gallons, f_c = %.4g dollars" % tuple(F[index])} for index in np.argsort(F[:, 1])]
+
+
+def generation_frames(run_directory, every=1):
+    # one frame for every every-th generation of a run recorded in run_directory (see RunHistory.py), showing the
+    # population, the final front and the map of a representative solution; runs recorded without the techniques of
+    # every generation only get the plot of the population
+    history = list(read_history(os.path.join(run_directory, HISTORY_FILE)))
+    population_path = os.path.join(run_directory, POPULATION_FILE)
+    populations = list(read_populations(population_path)) if os.path.exists(population_path) else []
+    populations += [None] * (len(history) - len(populations))
+    front = None
+    if os.path.exists(os.path.join(run_directory, ARCHIVE_FILE)):
+        with np.load(os.path.join(run_directory, ARCHIVE_FILE)) as archive:
+            front = archive["F"]
+    limits = objective_limits(*[F for metrics, F in history])
+
+    frames = []
+    for index, ((metrics, F), X) in enumerate(zip(history, populations)):
+        if index % every != 0 and index != len(history) - 1:  # the last generation is always shown
+            continue
+        highlight = representative_solution(F, limits) if X is not None else None
+        frames.append({"techniques": X[highlight] if X is not None else None, "F": F, "highlight": highlight,
+                       "front": front, "limits": limits,
+                       "title": "generation %d, hypervolume %.4g" % (metrics["n_gen"], metrics["hypervolume"])})
+    return frames
+
+
+def _set_worker_renderer(renderer):
+    global _WORKER_RENDERER
+    _WORKER_RENDERER = renderer
+
+
+def _render_in_worker(path_and_frame):
+    path, frame = path_and_frame
+    return _WORKER_RENDERER.render(path, **frame)
+
+
+def render_frames(renderer, frames, directory=FRAME_DIRECTORY, processes=RENDER_PROCESSES):
+    # renders every frame (a dictionary of arguments of MapRenderer.render) to a png file in directory and returns the
+    # paths of the files, in order
+    os.makedirs(directory, exist_ok=True)
+    paths = [os.path.join(directory, "frame_%05d.png" % index) for index in range(0, len(frames))]
+    if processes == 1:
+        return [renderer.render(path, **frame) for path, frame in zip(paths, frames)]
+    with Pool(processes, initializer=_set_worker_renderer, initargs=(renderer,)) as pool:
+        return pool.map(_render_in_worker, zip(paths, frames), chunksize=1)
+
+
+def assemble_animation(paths, output=ANIMATION_FILE, frames_per_second=FRAMES_PER_SECOND):
+    # joins the png files into a gif or mp4 animation; the frames are read one at a time, so long animations do not
+    # need to fit in memory
+    import imageio.v2 as imageio
+    if output.endswith(".mp4"):
+        writer = imageio.get_writer(output, fps=frames_per_second)
+    else:
+        writer = imageio.get_writer(output, mode="I", duration=1000 / frames_per_second, loop=0)
+    with writer:
+        for path in paths:
+            writer.append_data(imageio.imread(path))
+    return output
+
+
+def animate(renderer, frames, output=ANIMATION_FILE, directory=FRAME_DIRECTORY, processes=RENDER_PROCESSES,
+            frames_per_second=FRAMES_PER_SECOND):  # renders the frames and assembles them into an animation
+    return assemble_animation(render_frames(renderer, frames, directory, processes), output, frames_per_second)
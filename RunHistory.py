@@ -0,0 +1,208 @@
+import os
+import time
+import pickle
+import random
+import numpy as np
+from pymoo.core.callback import Callback
+from pymoo.util.misc import termination_from_tuple
+
+from DataCache import atomic_write
+from Parallel import non_dominated_front, non_dominated_mask
+
+# instead of keeping a copy of the whole algorithm for every generation (pymoo's save_history), the classes in this
+# file write what we need from every generation to disk as the run goes: the objective values and techniques of the
+# population, an archive of every non-dominated solution seen so far and its hypervolume; the algorithm can also be
+# checkpointed so an interrupted run can be resumed
+
+HISTORY_FILE = "history.npy"  # append-only file with one record per generation, read back with read_history
+ARCHIVE_FILE = "archive.npz"  # the non-dominated solutions seen so far
+CHECKPOINT_FILE = "checkpoint.pkl"  # the state of the algorithm when it was last checkpointed
+POPULATION_FILE = "populations.npy"  # append-only file with the techniques of the population of every generation, read
+# back with read_populations (used to render animations of a run, see Rendering.py)
+HISTORY_FIELDS = ["n_gen", "n_eval", "hypervolume", "archive_size", "pop_size", "seconds"]
+
+
+def hypervolume_2d(F, reference_point):
+    # the area dominated by the points F (for two objectives being minimized) and bounded by reference_point
+    F = np.asarray(F, dtype=float)
+    F = F[np.all(F < reference_point, axis=1)]
+    if len(F) == 0:
+        return 0.0
+    F = F[np.lexsort((F[:, 1], F[:, 0]))]  # sort by the first objective, then by the second
+    best_second = np.minimum.accumulate(F[:, 1])  # only points that improve the second objective add area
+    previous_second = np.concatenate([[reference_point[1]], best_second[:-1]])
+    return float(np.sum((reference_point[0] - F[:, 0]) * np.maximum(previous_second - best_second, 0)))
+
+
+def read_history(path):
+    # yields (metrics, F) for every generation written to a history file, where metrics is a dictionary with the fields
+    # of HISTORY_FIELDS and F holds the objective values of the population; an incomplete last record is ignored
+    with open(path, "rb") as history:
+        while True:
+            try:
+                metrics = np.load(history)
+                F = np.load(history)
+            except (ValueError, EOFError, OSError):
+                return
+            yield dict(zip(HISTORY_FIELDS, metrics.tolist())), F
+
+
+def read_populations(path):  # yields the (pop_size x n_counties) techniques of the population of every generation
+    with open(path, "rb") as populations:
+        while True:
+            try:
+                yield np.load(populations).astype(int)
+            except (ValueError, EOFError, OSError):
+                return
+
+
+class ParetoArchive:
+    # an elitist archive holding every non-dominated solution found during a run
+    def __init__(self, n_var=0, n_obj=2):
+        self.X = np.zeros((0, n_var), dtype=int)
+        self.F = np.zeros((0, n_obj))
+
+    def __len__(self):
+        return len(self.F)
+
+    def update(self, X, F):
+        # only the non-dominated candidates that no archived solution dominates are merged into the archive
+        X, F = non_dominated_front(np.asarray(X, dtype=int), F)
+        if len(self.F) > 0:
+            candidates = non_dominated_mask(np.concatenate([self.F, F]))[len(self.F):]
+            if not np.any(candidates):
+                return
+            X, F = non_dominated_front(np.concatenate([self.X, X[candidates]]), np.concatenate([self.F, F[candidates]]))
+        self.X, self.F = X, F
+
+    def save(self, path):
+        with atomic_write(path) as archive_file:
+            np.savez(archive_file, X=self.X, F=self.F)
+
+    def load(self, path):
+        with np.load(path) as archive_file:
+            self.X, self.F = archive_file["X"], archive_file["F"]
+
+
+class CallbackChain(Callback):  # calls several callbacks one after another, as pymoo only takes a single callback
+    def __init__(self, *callbacks):
+        super().__init__()
+        self.callbacks = [callback for callback in callbacks if callback is not None]
+
+    def notify(self, algorithm, **kwargs):
+        for callback in self.callbacks:
+            callback.notify(algorithm, **kwargs)
+
+
+def _random_callbacks(callback):  # the callbacks in a (possibly nested) chain that draw from their own random generator
+    if isinstance(callback, CallbackChain):
+        return [inner for chained in callback.callbacks for inner in _random_callbacks(chained)]
+    return [callback] if isinstance(getattr(callback, "rng", None), np.random.Generator) else []
+
+
+class RunRecorder(Callback):
+    # a callback that streams every generation to the history file in directory, keeps the Pareto archive and
+    # checkpoints the algorithm every checkpoint_every generations; the hypervolume is measured against reference_point,
+    # which defaults to 1.1 times the worst objective values of the first generation
+    def __init__(self, directory, checkpoint_every=10, reference_point=None):
+        super().__init__()
+        self.directory = directory
+        self.checkpoint_every = checkpoint_every
+        self.reference_point = None if reference_point is None else np.asarray(reference_point, dtype=float)
+        self.archive = None
+        self.start_time = time.time()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, file_name):
+        return os.path.join(self.directory, file_name)
+
+    def notify(self, algorithm, **kwargs):
+        X, F = algorithm.pop.get("X", "F")
+        if algorithm.off is not None and len(algorithm.off) > 0:  # non-dominated offspring can be cut by crowding
+            X, F = np.concatenate([X, algorithm.off.get("X")]), np.concatenate([F, algorithm.off.get("F")])
+        if self.archive is None:
+            self.archive = ParetoArchive(X.shape[1], F.shape[1])
+        if self.reference_point is None:
+            self.reference_point = 1.1 * np.max(F, axis=0)
+        self.archive.update(X, F)
+
+        metrics = np.array([algorithm.n_gen, algorithm.evaluator.n_eval,
+                            hypervolume_2d(self.archive.F, self.reference_point), len(self.archive),
+                            len(algorithm.pop), time.time() - self.start_time])
+        with open(self.path(HISTORY_FILE), "ab") as history:
+            np.save(history, metrics)
+            np.save(history, algorithm.pop.get("F"))
+        with open(self.path(POPULATION_FILE), "ab") as populations:
+            np.save(populations, algorithm.pop.get("X").astype(np.int16))
+
+        if self.checkpoint_every and algorithm.n_gen % self.checkpoint_every == 0:
+            self.checkpoint(algorithm)
+
+    def checkpoint(self, algorithm):
+        # the problem and callback are not stored, since they hold data and open resources that are recreated on resume
+        self.archive.save(self.path(ARCHIVE_FILE))
+        problem, callback, history = algorithm.problem, algorithm.callback, algorithm.history
+        algorithm.problem, algorithm.callback, algorithm.history = None, None, None
+        try:
+            state = {"algorithm": algorithm, "numpy_random_state": np.random.get_state(),
+                     "python_random_state": random.getstate(), "reference_point": self.reference_point,
+                     "callback_random_states": [chained.rng.bit_generator.state
+                                                for chained in _random_callbacks(callback)],
+                     "history_size": os.path.getsize(self.path(HISTORY_FILE)),
+                     "populations_size": os.path.getsize(self.path(POPULATION_FILE))}
+            with atomic_write(self.path(CHECKPOINT_FILE)) as checkpoint_file:
+                pickle.dump(state, checkpoint_file)
+        finally:
+            algorithm.problem, algorithm.callback, algorithm.history = problem, callback, history
+
+    def has_checkpoint(self):
+        return os.path.exists(self.path(CHECKPOINT_FILE))
+
+    def resume(self, problem, callback=None):
+        # load the last checkpoint and reattach the problem and callback (which defaults to this recorder); records
+        # written to the history file after the checkpoint are dropped, since those generations will be run again
+        with open(self.path(CHECKPOINT_FILE), "rb") as checkpoint_file:
+            state = pickle.load(checkpoint_file)
+        with open(self.path(HISTORY_FILE), "r+b") as history:
+            history.truncate(state["history_size"])
+        if "populations_size" in state and os.path.exists(self.path(POPULATION_FILE)):  # older checkpoints have none
+            with open(self.path(POPULATION_FILE), "r+b") as populations:
+                populations.truncate(state["populations_size"])
+        np.random.set_state(state["numpy_random_state"])
+        random.setstate(state["python_random_state"])
+        self.reference_point = state["reference_point"]
+        self.archive = ParetoArchive()
+        self.archive.load(self.path(ARCHIVE_FILE))
+
+        algorithm = state["algorithm"]
+        algorithm.problem = problem
+        algorithm.callback = self if callback is None else callback
+        for chained, random_state in zip(_random_callbacks(algorithm.callback),
+                                         state.get("callback_random_states", [])):  # older checkpoints have none
+            chained.rng.bit_generator.state = random_state
+        return algorithm
+
+
+def run_recorded(problem, algorithm, termination, seed, recorder, callback=None, resume=False, on_start=None):
+    # runs the algorithm to termination while recorder streams its history, resuming from the recorder's last checkpoint
+    # if resume is True and one exists; callback is any additional callback to run every generation, and on_start is
+    # called with the algorithm once it is set up or resumed, before it runs its next generation
+    chained = CallbackChain(callback, recorder) if callback is not None else recorder  # the recorder runs last, so it
+    # records and checkpoints the population after the other callbacks (such as local search) have changed it
+    if resume and recorder.has_checkpoint():  # the resumed run uses the given termination, so it can also be extended
+        algorithm = recorder.resume(problem, chained)
+        algorithm.termination = termination_from_tuple(termination)
+        algorithm.has_terminated = not algorithm.termination.do_continue(algorithm)
+    else:
+        for file_name in [HISTORY_FILE, POPULATION_FILE, ARCHIVE_FILE, CHECKPOINT_FILE]:  # a new run starts a new
+            # history
+            if os.path.exists(recorder.path(file_name)):
+                os.remove(recorder.path(file_name))
+        algorithm.setup(problem, termination=termination, seed=seed, callback=chained)
+
+    if on_start is not None:
+        on_start(algorithm)
+    while algorithm.has_next():
+        algorithm.next()
+    recorder.archive.save(recorder.path(ARCHIVE_FILE))
+    return algorithm.result()
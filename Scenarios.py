@@ -0,0 +1,108 @@
+import numpy as np
+
+from Crops import CROP_TYPES
+from IrrigationTechniques import efficiency_table
+from Parallel import ArrayProblem
+
+# yields and gradients are not known exactly, so a robust solution should do well over many possible versions of them
+# ("scenarios") instead of only the values in the data files; the scenarios are sampled once, and a population is then
+# evaluated in all scenarios at once as a (pop_size x n_scenarios x n_counties) tensor; the components of a solution do
+# not depend on the scenario, so they are only counted once; only f_w is risk sensitive, since the implementation cost
+# of a technique does not depend on the gradient and acreage is not perturbed, so f_c is the same in every scenario
+
+RISK_MEASURES = ["expected", "cvar"]
+YIELD_REGIONAL_VARIATION = 0.1  # standard deviation of the log of the yield factor of every crop type
+YIELD_LOCAL_VARIATION = 0.1  # standard deviation of the log of the yield factor of every crop in every county
+GRADIENT_VARIATION = 0.1  # standard deviation of the log of the gradient factor of every county
+CVAR_ALPHA = 0.9  # the conditional value at risk is the mean of the worst 1 - CVAR_ALPHA of the scenarios
+MAX_TENSOR_SIZE = 4000000  # populations are evaluated in chunks so that the tensors have at most this many elements
+
+
+def _lognormal_factors(rng, variation, size):  # random factors with a mean of one
+    return np.exp(variation * rng.standard_normal(size) - variation ** 2 / 2)
+
+
+def sample_scenarios(crop_table, county_gradients, number_scenarios, yield_regional_variation=YIELD_REGIONAL_VARIATION,
+                     yield_local_variation=YIELD_LOCAL_VARIATION, gradient_variation=GRADIENT_VARIATION, seed=1):
+    # samples the yields of every crop and the gradient of every county in every scenario and returns the data needed
+    # to evaluate solutions, as a dictionary of arrays with the scenarios along the first axis; the water used by a crop
+    # is proportional to its yield, so the precomputed water usage of every crop is simply scaled
+    rng = np.random.default_rng(seed)
+    yield_factors = _lognormal_factors(rng, yield_regional_variation, (number_scenarios, len(CROP_TYPES)))
+    yield_factors = yield_factors[:, crop_table.crop_type] * _lognormal_factors(rng, yield_local_variation,
+                                                                                 (number_scenarios, len(crop_table)))
+    county_water = np.stack([np.bincount(crop_table.county, weights=crop_table.gallons * factors,
+                                         minlength=crop_table.number_counties) for factors in yield_factors])
+
+    gradients = np.asarray(county_gradients, dtype=float) * _lognormal_factors(rng, gradient_variation,
+                                                                               (number_scenarios,
+                                                                                len(county_gradients)))
+    return {"county_water": county_water,  # (n_scenarios x n_counties)
+            "efficiency_table": efficiency_table(gradients.ravel()).reshape(number_scenarios, len(county_gradients),
+                                                                            -1)}  # (n_scenarios x n_counties x n_t)
+
+
+def scenario_water_usage(scenarios, population_techniques):
+    # f_w of every solution in every scenario, as a (pop_size x n_scenarios) array
+    population_techniques = np.asarray(population_techniques, dtype=int)
+    number_scenarios, number_counties, number_techniques = scenarios["efficiency_table"].shape
+    counties = np.arange(0, number_counties)
+    water = np.zeros((len(population_techniques), number_scenarios))
+    chunk_size = max(1, MAX_TENSOR_SIZE // (number_scenarios * number_counties))
+    for start in range(0, len(population_techniques), chunk_size):
+        chunk = population_techniques[start:start + chunk_size]
+        efficiencies = scenarios["efficiency_table"][:, counties, chunk].swapaxes(0, 1)  # (chunk x n_scenarios x
+        # n_counties)
+        water[start:start + chunk_size] = np.sum(scenarios["county_water"] / efficiencies, axis=-1)
+    return water
+
+
+def scenario_objectives(arrays, scenarios, population_techniques):
+    # f_w and f_c of every solution in every scenario, as a (pop_size x n_scenarios x 2) array; arrays holds the data
+    # that does not change between scenarios (see problem_arrays)
+    problem = ArrayProblem(arrays)
+    population_techniques = np.asarray(population_techniques, dtype=int)
+    num_components = np.sum(problem.components(population_techniques), axis=1)
+    objectives = np.zeros((len(population_techniques), len(scenarios["county_water"]), 2))
+    objectives[:, :, 0] = scenario_water_usage(scenarios, population_techniques)
+    objectives[:, :, 1] = problem.technique_cost(population_techniques, num_components)[:, np.newaxis]
+    return objectives
+
+
+def conditional_value_at_risk(values, alpha=CVAR_ALPHA, axis=1):  # the mean of the worst 1 - alpha of the values
+    values = np.sort(values, axis=axis)
+    tail = max(1, int(np.ceil((1 - alpha) * values.shape[axis] - 1e-9)))
+    return np.mean(np.take(values, np.arange(values.shape[axis] - tail, values.shape[axis]), axis=axis), axis=axis)
+
+
+def water_risk(water, risk_measure="cvar", alpha=CVAR_ALPHA):
+    # the risk measure of f_w over the scenarios of every solution, for water as returned by scenario_water_usage
+    return np.mean(water, axis=1) if risk_measure == "expected" else conditional_value_at_risk(water, alpha)
+
+
+def measure_risk(objectives, risk_measure="cvar", alpha=CVAR_ALPHA):
+    # the risk measure of f_w over the scenarios and f_c (the same in every scenario) of every solution, as a
+    # (pop_size x 2) array, for objectives as returned by scenario_objectives
+    return np.column_stack([water_risk(objectives[:, :, 0], risk_measure, alpha), objectives[:, 0, 1]])
+
+
+def robust_objectives(arrays, scenarios, population_techniques, alpha=CVAR_ALPHA):
+    # the expected value and the conditional value at risk of f_w and f_c of every solution over the scenarios, as a
+    # dictionary of (pop_size x 2) arrays keyed by risk measure
+    objectives = scenario_objectives(arrays, scenarios, population_techniques)
+    return {risk_measure: measure_risk(objectives, risk_measure, alpha) for risk_measure in RISK_MEASURES}
+
+
+class ScenarioProblem(ArrayProblem):
+    # the batched irrigation technique problem, in which f_w is measured over the scenarios with the risk measure
+    # ("expected" or "cvar"); the components and f_c are those of ArrayProblem
+    def __init__(self, arrays, scenarios, risk_measure="cvar", alpha=CVAR_ALPHA):
+        if risk_measure not in RISK_MEASURES:
+            raise ValueError("Risk measure is not present in list.")
+        super().__init__(arrays)
+        self.scenarios = scenarios
+        self.risk_measure = risk_measure
+        self.alpha = alpha
+
+    def water_usage(self, x):
+        return water_risk(scenario_water_usage(self.scenarios, x), self.risk_measure, self.alpha)
@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Font
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import DataCache  # noqa: E402
+from DataCache import load_sheet_rows  # noqa: E402
+
+
+def _original_rows(path):  # the rows the original loaders read: from the 2nd row up to (but not including) max_row
+    sheet = load_workbook(filename=path).active
+    return [tuple(sheet.cell(row, column).value for column in range(1, sheet.max_column + 1))
+            for row in range(2, sheet.max_row)]
+
+
+@pytest.mark.parametrize("trailing_style", [None, "bold", "normal"])
+def test_rows_match_original_loaders_with_styled_empty_trailing_row(tmp_path, trailing_style):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["county", "gradient"])
+    for county in range(0, 5):
+        sheet.append(["county %d" % county, county])
+    sheet.append(["last", None])
+    if trailing_style == "bold":  # an empty row that only holds formatting, which max_row counts
+        sheet.cell(row=10, column=1).font = Font(bold=True)
+    elif trailing_style == "normal":  # the stored dimension of the sheet grows, but max_row does not
+        sheet.cell(row=10, column=1).style = "Normal"
+    path = str(tmp_path / "Gradients.xlsx")
+    workbook.save(path)
+
+    expected = _original_rows(path)
+    assert load_sheet_rows(path, use_cache=False) == expected
+    assert load_sheet_rows(path) == expected  # written to the .npz cache
+    DataCache._LOADED_SHEETS.clear()
+    assert load_sheet_rows(path) == expected  # read back from the cache